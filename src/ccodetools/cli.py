@@ -1,21 +1,30 @@
+import sys
 import click
-import json
+import orjson
 from pprint import pprint
-from dataclasses import asdict, is_dataclass
 
-from .impl.tree_sitter import TreeSitterAnalyzer
 from .factory import make_analyzer
+from .impl.cached_analyzer import CachedAnalyzer
 
 
-def serialize(obj):
-    """Converte dataclasses e listas para dict (JSON-friendly)"""
-    if is_dataclass(obj):
-        return asdict(obj)
-    if isinstance(obj, list):
-        return [serialize(o) for o in obj]
-    if isinstance(obj, dict):
-        return {k: serialize(v) for k, v in obj.items()}
-    return obj
+def to_json(obj) -> bytes:
+    """Serializa resultados direto em JSON (dataclasses nativas no orjson)"""
+    return orjson.dumps(
+        obj,
+        # Result types use slots (no __dict__); anything orjson does not
+        # serialize natively goes through the generated to_dict
+        default=lambda o: o.to_dict(),
+        option=orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_INDENT_2,
+    )
+
+
+def echo_json(obj) -> None:
+    """Escreve o JSON em bytes direto no stdout (sem encode do click.echo)"""
+    out = sys.stdout.buffer
+    sys.stdout.flush()
+    out.write(to_json(obj))
+    out.write(b"\n")
+    out.flush()
 
 
 @click.group()
@@ -24,11 +33,34 @@ def serialize(obj):
     default="tree-sitter",
     help="Nome do analyzer a usar"
 )
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="CCODETOOLS_CACHE_DIR",
+    default=None,
+    help="Diretório do cache SQLite de resultados, reaproveitado entre execuções "
+         "(também via CCODETOOLS_CACHE_DIR)",
+)
 @click.pass_context
-def cli(ctx, analyzer):
+def cli(ctx, analyzer, cache_dir):
     """CLI para análise de código C"""
     ctx.ensure_object(dict)
-    ctx.obj["analyzer"] = make_analyzer(analyzer)
+    ctx.obj["analyzer_name"] = analyzer
+    ctx.obj["cache_dir"] = cache_dir
+
+
+def get_analyzer(ctx):
+    """Cria o analyzer no primeiro uso (--help não carrega bindings nativos)
+
+    Com --cache-dir os resultados persistem por conteúdo do arquivo: uma
+    nova execução sobre arquivos inalterados não refaz o parse.
+    """
+    if "analyzer" not in ctx.obj:
+        analyzer = make_analyzer(ctx.obj["analyzer_name"])
+        if ctx.obj.get("cache_dir"):
+            analyzer = CachedAnalyzer(analyzer, cache_dir=ctx.obj["cache_dir"])
+        ctx.obj["analyzer"] = analyzer
+    return ctx.obj["analyzer"]
 
 
 # -------------------------------------------------
@@ -37,14 +69,21 @@ def cli(ctx, analyzer):
 @cli.command()
 @click.argument("file_path", type=click.Path(exists=True))
 @click.option("--json", "as_json", is_flag=True, help="Saída em JSON")
+@click.option(
+    "--scope",
+    type=click.Choice(["all", "functions", "preproc"]),
+    default="all",
+    show_default=True,
+    help="Partes da análise (preproc não faz parse do arquivo)",
+)
 @click.pass_context
-def analyze_c_file(ctx, file_path, as_json):
+def analyze_c_file(ctx, file_path, as_json, scope):
     """Analisa completamente um arquivo C"""
-    analyzer = ctx.obj["analyzer"]
-    result = analyzer.analyze_file(file_path)
+    analyzer = get_analyzer(ctx)
+    result = analyzer.analyze_file(file_path, scope)
 
     if as_json:
-        click.echo(json.dumps(serialize(result), indent=2, ensure_ascii=False))
+        echo_json(result)
     else:
         pprint(result)
 
@@ -58,11 +97,11 @@ def analyze_c_file(ctx, file_path, as_json):
 @click.pass_context
 def list_functions(ctx, file_path, as_json):
     """Lista funções do arquivo"""
-    analyzer = ctx.obj["analyzer"]
+    analyzer = get_analyzer(ctx)
     functions = analyzer.list_functions(file_path)
 
     if as_json:
-        click.echo(json.dumps(serialize(functions), indent=2, ensure_ascii=False))
+        echo_json(functions)
     else:
         pprint(functions)
 
@@ -76,7 +115,7 @@ def list_functions(ctx, file_path, as_json):
 @click.pass_context
 def get_function_body(ctx, file_path, function_name):
     """Mostra o corpo de uma função"""
-    analyzer = ctx.obj["analyzer"]
+    analyzer = get_analyzer(ctx)
     body = analyzer.get_function_body(file_path, function_name)
 
     if body is None:
@@ -94,11 +133,11 @@ def get_function_body(ctx, file_path, function_name):
 @click.pass_context
 def get_preprocessor_directives(ctx, file_path, as_json):
     """Lista diretivas de pré-processador"""
-    analyzer = ctx.obj["analyzer"]
+    analyzer = get_analyzer(ctx)
     directives = analyzer.get_preprocessor_directives(file_path)
 
     if as_json:
-        click.echo(json.dumps(serialize(directives), indent=2, ensure_ascii=False))
+        echo_json(directives)
     else:
         pprint(directives)
 
@@ -1,13 +1,319 @@
 """Base class for C code analyzers with common utilities."""
+import hashlib
+import mmap
+import os
+import re
+import threading
+from dataclasses import dataclass
 from abc import ABC
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any
+
+from ..interface import AnalysisResult, AnalysisScope, FunctionInfo, PreprocessorDirective
+
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Alternation order mirrors the old per-line startswith() checks ('#ifdef' before '#if').
+# Starting at the literal '#' lets re skip ahead with a fast search instead of
+# trying a '^' anchor at every position; line start is verified per match.
+# Blanks may separate '#' from the keyword ('#  define', common in nested blocks).
+_DIRECTIVE_RE = re.compile(rb'#[ \t]*(include|define|ifdef|ifndef|if|elif|else|endif)[^\n]*')
+
+# What may precede '#' on a directive line (bytes.strip() whitespace minus '\n')
+_LEADING_WS = b' \t\r\f\v'
+
+# Directive keyword -> shared type string, so no str is decoded per directive
+_DIRECTIVE_TYPES = {
+    kind: kind.decode()
+    for kind in (b'include', b'define', b'ifdef', b'ifndef', b'if', b'elif', b'else', b'endif')
+}
+
+# Split a stripped '#define' line: the name ends at the first space, tab or '('
+_DEFINE_RE = re.compile(rb'#[ \t]*define\s*([^ \t(]*)(.*)', re.DOTALL)
+
+# Files at or above this size are mmap'ed and hashed with blake3 (multithreaded)
+LARGE_FILE_BYTES = 1 << 20
+
+
+def content_hash(content: bytes | mmap.mmap) -> str:
+    """Identity hash of file content (not used for security)."""
+    if blake3 is not None and len(content) >= LARGE_FILE_BYTES:
+        return blake3(content, max_threads=blake3.AUTO).hexdigest(length=16)
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(content)
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+# Process-wide, shared by every analyzer/backend so a file is hashed once
+# file_path -> ((st_dev, st_ino, st_mtime_ns, st_size), content_hash)
+_file_hash_cache: dict[str, tuple[tuple[int, int, int, int], str]] = {}
+_file_hash_lock = threading.Lock()
+
+
+def stat_fingerprint(file_path: str) -> tuple[int, int, int, int]:
+    """(st_dev, st_ino, st_mtime_ns, st_size) of file_path."""
+    st = os.stat(file_path)
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def lookup_file_hash(
+    file_path: str, fingerprint: tuple[int, int, int, int]
+) -> str | None:
+    """Known content hash of file_path if it is unchanged since last hashed."""
+    with _file_hash_lock:
+        cached = _file_hash_cache.get(file_path)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    return None
+
+
+def remember_file_hash(
+    file_path: str, fingerprint: tuple[int, int, int, int], h: str
+) -> None:
+    with _file_hash_lock:
+        _file_hash_cache[file_path] = (fingerprint, h)
+
+
+def file_hash(file_path: str) -> str:
+    """Content hash of file_path, re-read only when its stat fingerprint changes."""
+    fingerprint = stat_fingerprint(file_path)
+    h = lookup_file_hash(file_path, fingerprint)
+    if h is None:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size >= LARGE_FILE_BYTES:
+                # Hash the pages in place instead of copying them into bytes
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h = content_hash(mm)
+            else:
+                h = content_hash(f.read())
+        remember_file_hash(file_path, fingerprint, h)
+    return h
+
+
+def functions_by_name(functions: list[FunctionInfo], names: Iterable[str]) -> dict[str, FunctionInfo]:
+    """First FunctionInfo of each wanted name, from one pass over functions."""
+    wanted = frozenset(names)
+    found: dict[str, FunctionInfo] = {}
+    for func in functions:
+        if func.name in wanted and func.name not in found:
+            found[func.name] = func
+    return found
+
+
+@dataclass(slots=True, frozen=True)
+class WorkerFactory:
+    """Zero-argument analyzer factory that also carries the cache_id it builds.
+
+    Lets CachedAnalyzer check a worker backend's configuration without
+    building one.
+    """
+    build: Callable[[], Any]
+    cache_id: str
+
+    def __call__(self) -> Any:
+        return self.build()
+
+
+class LazyLines(Sequence):
+    """Read-only lines of content, split on b'\\n' the first time they are accessed.
+
+    Directive scans, symbol search and tree queries only need the content,
+    so most reads never pay for the list of lines.
+    """
+
+    __slots__ = ('_content', '_lines')
+
+    def __init__(self, content: bytes) -> None:
+        self._content = content
+        self._lines: list[bytes] | None = None
+
+    def _split(self) -> list[bytes]:
+        lines = self._lines
+        if lines is None:
+            lines = self._lines = self._content.split(b'\n')
+        return lines
+
+    def __getitem__(self, index):
+        return self._split()[index]
+
+    def __len__(self) -> int:
+        if self._lines is None:
+            return self._content.count(b'\n') + 1
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._split())
+
+
+# Process-wide read cache, one entry per path (a new version replaces the
+# old one), bounded by total content bytes; least recently read goes first
+# file_path -> ((st_dev, st_ino, st_mtime_ns, st_size), content, lines)
+_READ_CACHE_BYTES = 64 << 20
+_read_cache: OrderedDict[str, tuple[tuple[int, int, int, int], bytes, LazyLines]] = OrderedDict()
+_read_cache_bytes = 0
+_read_cache_lock = threading.Lock()
+
+
+def _read_file_bytes(file_path: str) -> bytes:
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(fd).st_size
+        # Readahead hints only pay off past a few pages; a small file is
+        # one read() either way, so skip the two extra syscalls
+        if size >= LARGE_FILE_BYTES and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _read_cached(
+    file_path: str, fingerprint: tuple[int, int, int, int]
+) -> tuple[bytes, LazyLines]:
+    """Content and lines of file_path, re-read only when its fingerprint changes."""
+    global _read_cache_bytes
+    with _read_cache_lock:
+        cached = _read_cache.get(file_path)
+        if cached is not None and cached[0] == fingerprint:
+            _read_cache.move_to_end(file_path)
+            return cached[1], cached[2]
+    content = _read_file_bytes(file_path)
+    lines = LazyLines(content)
+    with _read_cache_lock:
+        old = _read_cache.pop(file_path, None)
+        if old is not None:
+            _read_cache_bytes -= len(old[1])
+        if len(content) <= _READ_CACHE_BYTES:
+            _read_cache[file_path] = (fingerprint, content, lines)
+            _read_cache_bytes += len(content)
+            while _read_cache_bytes > _READ_CACHE_BYTES:
+                _, evicted = _read_cache.popitem(last=False)
+                _read_cache_bytes -= len(evicted[1])
+    return content, lines
 
 
 class BaseAnalyzer(ABC):
     """Base class providing common utilities for C code analyzers."""
 
-    def _read_file(self, file_path: str) -> tuple[str, list[str]]:
-        """Read file and return content as bytes and lines as list of strings."""
-        with open(file_path, 'rb') as f:
-            content = f.read()
-        lines = content.decode('utf-8').split('\n')
-        return content, lines
+    @property
+    def cache_id(self) -> str:
+        """Key identifying this analyzer's results in external caches."""
+        return self.__class__.__name__
+
+    def worker_factory(self) -> 'WorkerFactory':
+        """Picklable factory building an analyzer configured like this one.
+
+        Worker processes (CachedAnalyzer.analyze_paths) build their backend
+        with it, so their results carry the same cache_id.
+        """
+        return WorkerFactory(type(self), self.cache_id)
+
+    def _read_file(self, file_path: str) -> tuple[bytes, LazyLines]:
+        """Read file and return content and lines as bytes (decode lazily, per line).
+
+        The pair is shared between callers while the file's stat fingerprint
+        is unchanged; lines are split only when first indexed.
+        """
+        return _read_cached(file_path, stat_fingerprint(file_path))
+
+    def _read_bytes(self, file_path: str) -> bytes:
+        """Content of file_path alone, for the scans that never look at lines."""
+        return _read_cached(file_path, stat_fingerprint(file_path))[0]
+
+    def count_functions(self, file_path: str) -> int:
+        """Number of functions list_functions would return."""
+        return len(self.list_functions(file_path))
+
+    def get_functions_by_names(self, file_path: str, names: Iterable[str]) -> dict[str, FunctionInfo]:
+        """FunctionInfo of each requested function, one pass over list_functions."""
+        return functions_by_name(self.list_functions(file_path), names)
+
+    def _result(
+        self,
+        file_path: str,
+        buckets: dict[str, list] | None = None,
+        directives: dict[str, list[PreprocessorDirective]] | None = None,
+    ) -> AnalysisResult:
+        """AnalysisResult of the extracted parts; parts not extracted stay empty."""
+        buckets = buckets or {}
+        directives = directives or {}
+        return AnalysisResult(
+            file_path=file_path,
+            functions=buckets.get('functions', []),
+            includes=directives.get('includes', []),
+            defines=directives.get('defines', []),
+            conditionals=directives.get('conditionals', []),
+            structs=buckets.get('structs', []),
+            enums=buckets.get('enums', []),
+            typedefs=buckets.get('typedefs', []),
+        )
+
+    def _partial_analysis(self, file_path: str, scope: AnalysisScope) -> AnalysisResult | None:
+        """analyze_file result for a partial scope, None when scope is 'all'."""
+        if scope == 'all':
+            return None
+        if scope == 'preproc':
+            content = self._read_bytes(file_path)
+            return self._result(file_path, directives=self._scan_directives(content))
+        if scope == 'functions':
+            return self._result(file_path, buckets={'functions': self.list_functions(file_path)})
+        raise ValueError(f"Analysis scope '{scope}' not supported.")
+
+    def _scan_directives(self, content: bytes) -> dict[str, list[PreprocessorDirective]]:
+        """Collect includes, defines and conditionals with one regex pass over content."""
+        includes: list[PreprocessorDirective] = []
+        defines: list[PreprocessorDirective] = []
+        conditionals: list[PreprocessorDirective] = []
+
+        add_define = defines.append
+        types = _DIRECTIVE_TYPES
+        # keyword -> bucket append: one dict lookup instead of a compare chain
+        add_to = dict.fromkeys(types, conditionals.append)
+        add_to[b'include'] = includes.append
+
+        # Matches come in order, so line numbers are counted incrementally
+        count = content.count
+        rfind = content.rfind
+        line = 1
+        pos = 0
+        for m in _DIRECTIVE_RE.finditer(content):
+            start = m.start()
+            line_start = rfind(b'\n', 0, start) + 1
+            if line_start != start and content[line_start:start].strip(_LEADING_WS):
+                # '#' in the middle of a line (comment, string, ...)
+                continue
+            line += count(b'\n', pos, start)
+            pos = start
+
+            text, kind = m.group(0, 1)
+
+            if kind == b'define':
+                name, value = _DEFINE_RE.match(text.rstrip()).groups()
+                value = value.strip() or None
+                if not name:
+                    # No name before the delimiter, keep the whole rest as before
+                    name = value or b''
+                add_define(PreprocessorDirective(
+                    'define',
+                    name.decode('utf-8'),
+                    line,
+                    value.decode('utf-8') if value is not None else None
+                ))
+            else:
+                add_to[kind](PreprocessorDirective(types[kind], text.rstrip().decode('utf-8'), line))
+
+        return {
+            'includes': includes,
+            'defines': defines,
+            'conditionals': conditionals,
+        }
@@ -1,129 +1,456 @@
-import hashlib
-from typing import Any
+import mmap
+import multiprocessing
+import os
+import pickle
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Iterable
 from collections import OrderedDict
-from ..interface import CCodeAnalyzer, AnalysisResult, FunctionInfo, PreprocessorDirective
+from ..interface import CCodeAnalyzer, AnalysisResult, AnalysisScope, FunctionInfo, PreprocessorDirective
+from .base import (
+    LARGE_FILE_BYTES,
+    WorkerFactory,
+    content_hash as _content_hash,
+    functions_by_name,
+    lookup_file_hash,
+    remember_file_hash,
+    stat_fingerprint,
+)
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """Cached state of one file version"""
+    file_path: str
+    hash: str
+    derived: dict[str, Any] = field(default_factory=dict)
+    # Rows of this version are in the SQLite cache (older versions pruned)
+    persisted: bool = False
+
+
+def _analysis_subset(result: AnalysisResult, scope: AnalysisScope) -> AnalysisResult:
+    """Partial-scope view of a full analysis result."""
+    if scope == "functions":
+        return replace(
+            result, includes=[], defines=[], conditionals=[],
+            structs=[], enums=[], typedefs=[],
+        )
+    if scope == "preproc":
+        return replace(result, functions=[], structs=[], enums=[], typedefs=[])
+    raise ValueError(f"Analysis scope '{scope}' not supported.")
+
+
+def _directives_of(result: AnalysisResult) -> dict[str, list[PreprocessorDirective]]:
+    """get_preprocessor_directives view of a full analysis result (lists shared, not copied)."""
+    return {
+        "includes": result.includes,
+        "defines": result.defines,
+        "conditionals": result.conditionals,
+    }
+
+
+# Per-process analyzer used by analyze_paths workers
+_worker_analyzer: "CachedAnalyzer | None" = None
+
+
+def _init_worker(
+    analyzer_factory: Callable[[], CCodeAnalyzer], cache_dir: Path | None, backend: str
+) -> None:
+    global _worker_analyzer
+    # Each worker builds its own backend: parser state can't be shared across processes
+    _worker_analyzer = CachedAnalyzer(analyzer_factory(), cache_dir=cache_dir)
+    if _worker_analyzer._backend != backend:
+        # Its results would be stored under the parent's key: fail the pool
+        raise ValueError(
+            f"analyzer_factory builds backend {_worker_analyzer._backend!r}, cache is for {backend!r}"
+        )
+
+
+def _analyze_in_worker(file_path: str) -> AnalysisResult:
+    assert _worker_analyzer is not None
+    return _worker_analyzer.analyze_file(file_path)
 
 
 class CachedAnalyzer(CCodeAnalyzer):
     """
     Decorator / Proxy that adds caching to any CCodeAnalyzer.
+
+    If cache_dir is given, derived artifacts are also persisted to a
+    SQLite database there, so results survive across processes.
     """
 
     def __init__(
         self,
         analyzer: CCodeAnalyzer,
-        max_files: int = 32
+        max_files: int = 32,
+        cache_dir: str | Path | None = None
     ) -> None:
         self._analyzer = analyzer
+        # Identifies the backend *and* its configuration (e.g. compile args)
+        self._backend = getattr(analyzer, "cache_id", analyzer.__class__.__name__)
         self._max_files = max_files
+        # Reused read buffer, grows up to LARGE_FILE_BYTES
+        self._buf = bytearray(1 << 16)
+        self._cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._db = self._open_db(self._cache_dir) if self._cache_dir is not None else None
 
         # LRU cache by file
         # key = (backend_id, file_path, content_hash)
+        # derived artifacts are keyed by name, "<artifact>:<function_name>"
+        # for per-function queries
         self._file_cache: OrderedDict[
-            tuple[str, str, str], dict[str, Any]
+            tuple[str, str, str], CacheEntry
         ] = OrderedDict()
 
+    # ---------- persistent cache ----------
+
+    @staticmethod
+    def _open_db(cache_dir: Path) -> sqlite3.Connection:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Generous timeout: analyze_paths workers write concurrently
+        db = sqlite3.connect(cache_dir / "cache.sqlite3", timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            " backend_id TEXT, file_path TEXT, content_hash TEXT,"
+            " artifact TEXT, blob BLOB,"
+            " PRIMARY KEY (backend_id, file_path, content_hash, artifact))"
+        )
+        return db
+
+    def _load_artifacts(self, file_path: str, content_hash: str) -> dict[str, Any]:
+        if self._db is None:
+            return {}
+        rows = self._db.execute(
+            "SELECT artifact, blob FROM artifacts"
+            " WHERE backend_id = ? AND file_path = ? AND content_hash = ?",
+            (self._backend_id(), file_path, content_hash),
+        )
+        return {artifact: pickle.loads(blob) for artifact, blob in rows}
+
+    def _store_artifact(self, entry: CacheEntry, artifact: str, value: Any) -> None:
+        if self._db is None:
+            return
+        with self._db:
+            if not entry.persisted:
+                # First row of this file version: drop the older versions'
+                # rows, no later lookup can match their content hash
+                self._db.execute(
+                    "DELETE FROM artifacts"
+                    " WHERE backend_id = ? AND file_path = ? AND content_hash <> ?",
+                    (self._backend_id(), entry.file_path, entry.hash),
+                )
+                entry.persisted = True
+            self._db.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (
+                    self._backend_id(),
+                    entry.file_path,
+                    entry.hash,
+                    artifact,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                ),
+            )
+
     # ---------- internal helpers ----------
 
     def _backend_id(self) -> str:
-        return self._analyzer.__class__.__name__
+        return self._backend
 
-    def _read_and_hash(self, file_path: str) -> tuple[bytes, str]:
+    def _read_and_hash(self, file_path: str) -> str:
+        """Hash file content without keeping it (entries hold derived results only)."""
         with open(file_path, "rb") as f:
-            content = f.read()
-        h = hashlib.sha256(content).hexdigest()
-        return content, h
-
-    def _get_file_entry(self, file_path: str) -> dict[str, Any]:
-        content, content_hash = self._read_and_hash(file_path)
-        key = (self._backend_id(), file_path, content_hash)
-
-        if key in self._file_cache:
+            size = os.fstat(f.fileno()).st_size
+            if size >= LARGE_FILE_BYTES:
+                # Hash the pages in place; the mapping is closed right after
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return _content_hash(mm)
+
+            # Small file: read into a reused buffer, no per-file allocation
+            if len(self._buf) < size:
+                self._buf = bytearray(size)
+            n = f.readinto(self._buf)
+            with memoryview(self._buf) as view:
+                return _content_hash(view[:n])
+
+    def _get_file_entry(self, file_path: str) -> CacheEntry:
+        fingerprint = stat_fingerprint(file_path)
+
+        # Stat fast path: hash shared across backends, skip read + hash
+        content_hash = lookup_file_hash(file_path, fingerprint)
+        if content_hash is None:
+            content_hash = self._read_and_hash(file_path)
+            remember_file_hash(file_path, fingerprint, content_hash)
+
+        key = (self._backend, file_path, content_hash)
+        file_cache = self._file_cache
+
+        entry = file_cache.get(key)
+        if entry is not None:
             # LRU bump
-            self._file_cache.move_to_end(key)
-            return self._file_cache[key]
+            file_cache.move_to_end(key)
+            return entry
 
         # Cache miss → evict if needed
-        if len(self._file_cache) >= self._max_files:
-            self._file_cache.popitem(last=False)
-
-        entry: dict[str, Any] = {
-            "file_path": file_path,
-            "hash": content_hash,
-            "content": content,
-            "derived": {}
-        }
-
-        self._file_cache[key] = entry
+        if len(file_cache) >= self._max_files:
+            file_cache.popitem(last=False)
+
+        derived = self._load_artifacts(file_path, content_hash)
+        entry = CacheEntry(
+            file_path=file_path,
+            hash=content_hash,
+            derived=derived,
+            # Stored rows mean the older versions were pruned already
+            persisted=bool(derived),
+        )
+
+        file_cache[key] = entry
         return entry
 
     # ---------- delegated + cached API ----------
 
-    def analyze_file(self, file_path: str) -> AnalysisResult:
+    def _derived(
+        self,
+        file_path: str,
+        artifact: str,
+        compute: Callable[[str], Any],
+        subset_of_analysis: Callable[[AnalysisResult], Any] | None = None,
+    ) -> Any:
+        """Cached artifact of file_path, computed on first request.
+
+        Artifacts that are a part of analyze_file's result are taken from
+        an already cached analysis_result instead of being recomputed.
+        """
         entry = self._get_file_entry(file_path)
-
-        if "analysis_result" not in entry["derived"]:
-            entry["derived"]["analysis_result"] = \
-                self._analyzer.analyze_file(file_path)
-
-        return entry["derived"]["analysis_result"]
+        derived = entry.derived
+
+        if artifact not in derived:
+            analysis = derived.get("analysis_result")
+            if subset_of_analysis is not None and analysis is not None:
+                derived[artifact] = subset_of_analysis(analysis)
+            else:
+                derived[artifact] = compute(file_path)
+            self._store_artifact(entry, artifact, derived[artifact])
+
+        return derived[artifact]
+
+    def analyze_file(self, file_path: str, scope: AnalysisScope = "all") -> AnalysisResult:
+        if scope == "all":
+            return self._derived(
+                file_path, "analysis_result", self._analyzer.analyze_file
+            )
+        return self._derived(
+            file_path,
+            f"analysis_result:{scope}",
+            lambda p: self._analyzer.analyze_file(p, scope),
+            lambda result: _analysis_subset(result, scope),
+        )
+
+    def analyze_paths(
+        self,
+        paths: Iterable[str],
+        max_workers: int | None = None,
+        analyzer_factory: Callable[[], CCodeAnalyzer] | None = None,
+        min_misses: int = 1,
+    ) -> dict[str, AnalysisResult]:
+        """Analyze many files, fanning cache misses out to a process pool.
+
+        Each worker builds its own analyzer with analyzer_factory, by default
+        the wrapped analyzer's worker_factory() (same class and configuration),
+        and, when cache_dir is set, writes its results to the shared SQLite
+        cache. Analyzers without worker_factory need an explicit factory.
+
+        Workers are spawned, not forked, so callers with running threads or
+        an event loop are safe. With fewer than min_misses distinct uncached
+        paths no pool is started and the misses go through analyze_files'
+        thread path instead.
+        """
+        results, entries = self._cached_analyses(paths)
+        misses = list(entries)
+
+        if 0 < len(misses) < min_misses:
+            self._analyze_misses(entries, results, max_workers)
+        elif misses:
+            factory = self._worker_factory(analyzer_factory)
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(factory, self._cache_dir, self._backend),
+            ) as pool:
+                try:
+                    for file_path, result in zip(
+                        misses, pool.map(_analyze_in_worker, misses)
+                    ):
+                        # Already persisted by the worker
+                        entries[file_path].derived["analysis_result"] = result
+                        results[file_path] = result
+                except BrokenProcessPool as e:
+                    raise RuntimeError(
+                        f"analyze_paths workers failed to start a {self._backend!r} backend"
+                        " (see the worker error above; check analyzer_factory)"
+                    ) from e
+
+        return results
+
+    def _worker_factory(
+        self, analyzer_factory: Callable[[], CCodeAnalyzer] | None
+    ) -> Callable[[], CCodeAnalyzer]:
+        """Factory for analyze_paths workers, checked to build this backend's configuration."""
+        factory = analyzer_factory
+        if factory is None:
+            worker_factory = getattr(self._analyzer, "worker_factory", None)
+            if worker_factory is None:
+                raise TypeError(
+                    f"{type(self._analyzer).__name__} has no worker_factory(); "
+                    "pass analyzer_factory to analyze_paths"
+                )
+            factory = worker_factory()
+        # Worker results are stored under this cache's backend key, so the
+        # worker backend must be configured the same way. A factory that
+        # carries its cache_id is checked here; any other is checked by
+        # _init_worker once built in the worker
+        if isinstance(factory, WorkerFactory) and factory.cache_id != self._backend:
+            raise ValueError(
+                f"analyzer_factory builds backend {factory.cache_id!r}, cache is for {self._backend!r}"
+            )
+        return factory
+
+    def analyze_files(
+        self,
+        paths: Iterable[str],
+        max_workers: int | None = None
+    ) -> dict[str, AnalysisResult]:
+        """Analyze many files, batching cache misses through the wrapped
+        analyzer's thread-pool analyze_files when it has one.
+
+        Lighter than analyze_paths (no worker processes), for callers such
+        as the MCP server that analyze batches on demand.
+        """
+        results, entries = self._cached_analyses(paths)
+        if entries:
+            self._analyze_misses(entries, results, max_workers)
+        return results
+
+    def _analyze_misses(
+        self,
+        entries: dict[str, CacheEntry],
+        results: dict[str, AnalysisResult],
+        max_workers: int | None,
+    ) -> None:
+        """Analyze the uncached entries in this process, caching into entries and results."""
+        batch = getattr(self._analyzer, "analyze_files", None)
+        if batch is not None:
+            computed = batch(list(entries), max_workers)
+        else:
+            computed = {p: self._analyzer.analyze_file(p) for p in entries}
+        for file_path, entry in entries.items():
+            result = computed[file_path]
+            entry.derived["analysis_result"] = result
+            self._store_artifact(entry, "analysis_result", result)
+            results[file_path] = result
+
+    def _cached_analyses(
+        self, paths: Iterable[str]
+    ) -> tuple[dict[str, AnalysisResult], dict[str, CacheEntry]]:
+        """Cached analysis results of paths, and the entries of the misses."""
+        results: dict[str, AnalysisResult] = {}
+        entries: dict[str, CacheEntry] = {}
+
+        for file_path in paths:
+            if file_path in results or file_path in entries:
+                continue
+            entry = self._get_file_entry(file_path)
+            if "analysis_result" in entry.derived:
+                results[file_path] = entry.derived["analysis_result"]
+            else:
+                entries[file_path] = entry
+        return results, entries
+
+    def edit(self, file_path: str, *args: Any, **kwargs: Any) -> None:
+        """Forward an edit report to the wrapped analyzer (see TreeSitterAnalyzer.edit).
+
+        Cached results need no invalidation, they are keyed by content hash.
+        """
+        edit = getattr(self._analyzer, "edit", None)
+        if edit is not None:
+            edit(file_path, *args, **kwargs)
 
     def list_functions(self, file_path: str) -> list[FunctionInfo]:
-        entry = self._get_file_entry(file_path)
+        return self._derived(
+            file_path, "functions", self._analyzer.list_functions,
+            lambda result: result.functions
+        )
 
-        if "functions" not in entry["derived"]:
-            entry["derived"]["functions"] = \
-                self._analyzer.list_functions(file_path)
+    def count_functions(self, file_path: str) -> int:
+        return len(self.list_functions(file_path))
 
-        return entry["derived"]["functions"]
+    def get_functions_by_names(self, file_path: str, names: Iterable[str]) -> dict[str, FunctionInfo]:
+        return functions_by_name(self.list_functions(file_path), names)
 
     def get_call_graph(self, file_path: str) -> dict[str, list[str]]:
-        entry = self._get_file_entry(file_path)
-
-        if "call_graph" not in entry["derived"]:
-            entry["derived"]["call_graph"] = \
-                self._analyzer.get_call_graph(file_path)
-
-        return entry["derived"]["call_graph"]
+        return self._derived(
+            file_path, "call_graph", self._analyzer.get_call_graph
+        )
 
     def list_globals(self, file_path: str) -> list[dict[str, Any]]:
-        entry = self._get_file_entry(file_path)
-
-        if "globals" not in entry["derived"]:
-            entry["derived"]["globals"] = \
-                self._analyzer.list_globals(file_path)
-
-        return entry["derived"]["globals"]
-
-    # ---------- pass-through (no cache yet) ----------
+        return self._derived(
+            file_path, "globals", self._analyzer.list_globals
+        )
 
     def get_function_body(self, file_path: str, function_name: str) -> str | None:
-        return self._analyzer.get_function_body(file_path, function_name)
+        return self._derived(
+            file_path, f"function_body:{function_name}",
+            lambda p: self._analyzer.get_function_body(p, function_name)
+        )
 
     def get_preprocessor_directives(
         self, file_path: str
     ) -> dict[str, list[PreprocessorDirective]]:
-        return self._analyzer.get_preprocessor_directives(file_path)
+        return self._derived(
+            file_path, "preprocessor_directives",
+            self._analyzer.get_preprocessor_directives,
+            _directives_of,
+        )
 
     def get_function_dependencies(
         self, file_path: str, function_name: str
     ) -> dict[str, Any]:
-        return self._analyzer.get_function_dependencies(file_path, function_name)
+        return self._derived(
+            file_path, f"dependencies:{function_name}",
+            lambda p: self._analyzer.get_function_dependencies(p, function_name)
+        )
 
     def summarize_function(
         self, file_path: str, function_name: str
     ) -> dict[str, Any]:
-        return self._analyzer.summarize_function(file_path, function_name)
+        return self._derived(
+            file_path, f"summary:{function_name}",
+            lambda p: self._analyzer.summarize_function(p, function_name)
+        )
 
     def find_symbol(self, file_path: str, symbol: str) -> dict[str, Any]:
-        return self._analyzer.find_symbol(file_path, symbol)
+        return self._derived(
+            file_path, f"symbol:{symbol}",
+            lambda p: self._analyzer.find_symbol(p, symbol)
+        )
 
     def get_error_handling_paths(
         self, file_path: str, function_name: str
     ) -> list[dict[str, Any]]:
-        return self._analyzer.get_error_handling_paths(file_path, function_name)
+        return self._derived(
+            file_path, f"error_paths:{function_name}",
+            lambda p: self._analyzer.get_error_handling_paths(p, function_name)
+        )
 
     def list_side_effects(
         self, file_path: str, function_name: str
     ) -> dict[str, Any]:
-        return self._analyzer.list_side_effects(file_path, function_name)
+        return self._derived(
+            file_path, f"side_effects:{function_name}",
+            lambda p: self._analyzer.list_side_effects(p, function_name)
+        )
@@ -1,19 +1,85 @@
+import ctypes
+import functools
+import hashlib
 import os
-from typing import Any
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from sys import intern
+from typing import Any, ClassVar
 from dotenv import load_dotenv
 from ..interface import (
     AnalysisResult,
+    AnalysisScope,
+    EnumInfo,
     FunctionInfo,
+    Parameter,
     PreprocessorDirective,
+    StructInfo,
 )
-from .base import BaseAnalyzer
-from clang.cindex import Config
+from .base import BaseAnalyzer, WorkerFactory, file_hash
+from clang.cindex import Config, conf
 
-load_dotenv()
+# .env only supplies LIBCLANG_PATH, skip parsing it when already set
+if "LIBCLANG_PATH" not in os.environ:
+    load_dotenv()
 
 path_clang_library = os.getenv("LIBCLANG_PATH", "/usr/lib/llvm-18/lib/libclang.so.1")
 
-Config.set_library_file(path_clang_library)
+# Pin the library once, even if this module is reloaded
+if not Config.loaded:
+    Config.set_library_file(path_clang_library)
+
+_DEFAULT_COMPILE_ARGS: tuple[str, ...] = ("-std=c11",)
+
+# Per-thread Index for analyze_files workers; other threads use the shared one
+_thread_state = threading.local()
+
+# CXChildVisitResult
+_CHILD_VISIT_CONTINUE = 1
+_CHILD_VISIT_RECURSE = 2
+
+
+@functools.lru_cache(maxsize=None)
+def _is_from_main_file():
+    """clang_Location_isFromMainFile, which clang.cindex does not register."""
+    from clang.cindex import SourceLocation
+    fn = conf.lib.clang_Location_isFromMainFile
+    fn.argtypes = [SourceLocation]
+    fn.restype = ctypes.c_uint
+    return fn
+
+
+@functools.lru_cache(maxsize=None)
+def _file_visitors():
+    """ctypes cursor visitors for file walks, built once.
+
+    Both take data = (tu, append). The first collects the main-file direct
+    children of a cursor, the second a whole subtree in preorder, with
+    libclang doing the recursion instead of one get_children() per node.
+    """
+    from clang.cindex import callbacks
+    is_main = _is_from_main_file()
+    # Cursor.location would also cache the result on every header cursor
+    get_location = conf.lib.clang_getCursorLocation
+
+    def main_file_children(child, parent, data):
+        if is_main(get_location(child)):
+            child._tu = data[0]
+            data[1](child)
+        return _CHILD_VISIT_CONTINUE
+
+    def subtree(child, parent, data):
+        child._tu = data[0]
+        data[1](child)
+        return _CHILD_VISIT_RECURSE
+
+    return (
+        callbacks["cursor_visit"](main_file_children),
+        callbacks["cursor_visit"](subtree),
+    )
+
 
 
 class ClangAnalyzer(BaseAnalyzer):
@@ -21,9 +87,16 @@ class ClangAnalyzer(BaseAnalyzer):
     Semantic C analyzer based on libclang.
     """
 
-    def __init__(self, compile_args: list[str] | None = None) -> None:
+    # One Index shared by all instances
+    _index: ClassVar[Any] = None
+
+    def __init__(
+        self,
+        compile_args: list[str] | None = None,
+        max_tus: int = 16
+    ) -> None:
         try:
-            from clang.cindex import Index, CursorKind
+            from clang.cindex import Index, CursorKind, TranslationUnit
         except Exception as e:
             raise RuntimeError(
                 "ClangAnalyzer requires libclang to be installed. "
@@ -31,119 +104,373 @@ class ClangAnalyzer(BaseAnalyzer):
             ) from e
         self._Index = Index
         self._CursorKind = CursorKind
-        self._index = Index.create()
-        self._compile_args = compile_args or ["-std=c11"]
+        self._TranslationUnit = TranslationUnit
+        if ClangAnalyzer._index is None:
+            ClangAnalyzer._index = Index.create()
+        # Own copy, mutating the caller's list must not change cache keys
+        self._compile_args = list(compile_args or _DEFAULT_COMPILE_ARGS)
+        self._max_tus = max_tus
+
+        # cursor kind -> handler, for the fused analyze_file walk
+        self._analysis_handlers = {
+            CursorKind.FUNCTION_DECL: self._handle_function,
+            CursorKind.STRUCT_DECL: self._handle_struct,
+            CursorKind.ENUM_DECL: self._handle_enum,
+            CursorKind.TYPEDEF_DECL: self._handle_typedef,
+        }
+        self._function_handlers = {
+            CursorKind.FUNCTION_DECL: self._handle_function,
+        }
+
+        # LRU cache of parsed TUs
+        # key = (file_path, content_hash, compile_args, skip_function_bodies)
+        self._tu_cache: OrderedDict[
+            tuple[str, str, tuple[str, ...], bool], Any
+        ] = OrderedDict()
+
+        # Name indexes built lazily per cached TU, same key, evicted with it
+        # key -> {"functions": {name: cursor}, "symbols": {spelling: [line, ...]}}
+        self._tu_indexes: dict[tuple[str, str, tuple[str, ...], bool], dict[str, dict]] = {}
+        # Guards both caches; parsing itself runs outside of it
+        self._tu_lock = threading.Lock()
 
     # ---------- internal ----------
 
-    def _parse(self, file_path: str):
-        return self._index.parse(
-            file_path,
-            args=self._compile_args,
+    def _parse(self, file_path: str, skip_function_bodies: bool = False):
+        """Return the TU for file_path, parsing only on cache miss."""
+        return self._parse_keyed(file_path, skip_function_bodies)[1]
+
+    def _parse_keyed(self, file_path: str, skip_function_bodies: bool = False):
+        """Return (cache key, TU) for file_path, parsing only on cache miss.
+
+        skip_function_bodies=True is for declaration-only queries: libclang
+        then reports function definitions as plain declarations without
+        body extents. A cached full TU is reused for such queries, and
+        parsing the full TU drops the declaration-only one it supersedes.
+
+        When the file changed since it was parsed, its cached TU is reparsed
+        in place, reusing the precompiled preamble of its headers.
+
+        Note: only the main file is fingerprinted, edits to included
+        headers do not invalidate the cached TU.
+        """
+        content_hash = file_hash(file_path)
+        compile_args = tuple(self._compile_args)
+
+        full_key = (file_path, content_hash, compile_args, False)
+        key = (file_path, content_hash, compile_args, skip_function_bodies)
+
+        with self._tu_lock:
+            # A full TU also answers declaration-only queries
+            for candidate in (full_key, key) if skip_function_bodies else (key,):
+                if candidate in self._tu_cache:
+                    # LRU bump
+                    self._tu_cache.move_to_end(candidate)
+                    return candidate, self._tu_cache[candidate]
+
+            # TUs of this file parsed from older content are all dropped (any
+            # flavor or args); one with the same args and flavor is reparsed
+            # in place instead of parsing from scratch
+            tu = None
+            for stale in [
+                k for k in self._tu_cache if k[0] == file_path and k[1] != content_hash
+            ]:
+                stale_tu = self._tu_cache.pop(stale)
+                self._tu_indexes.pop(stale, None)
+                if tu is None and stale[2] == compile_args and stale[3] == skip_function_bodies:
+                    tu = stale_tu
+
+        if tu is None or not self._reparse(tu):
+            # Build a precompiled preamble (the included headers) so later
+            # reparses after edits only recompile the file itself
+            options = self._TranslationUnit.PARSE_PRECOMPILED_PREAMBLE
+            if skip_function_bodies:
+                # Declaration-only TU: no bodies, no end-of-TU semantic finalization
+                options |= (
+                    self._TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+                    | self._TranslationUnit.PARSE_INCOMPLETE
+                )
+
+            index = getattr(_thread_state, "index", None) or self._index
+            tu = index.parse(
+                file_path,
+                args=self._compile_args,
+                options=options,
+            )
+
+        with self._tu_lock:
+            # Cache miss → evict if needed
+            if key not in self._tu_cache and len(self._tu_cache) >= self._max_tus:
+                evicted, _ = self._tu_cache.popitem(last=False)
+                self._tu_indexes.pop(evicted, None)
+            self._tu_cache[key] = tu
+            if not skip_function_bodies:
+                # The full TU now answers declaration-only queries too
+                self._tu_cache.pop((file_path, content_hash, compile_args, True), None)
+        return key, tu
+
+    @staticmethod
+    def _reparse(tu) -> bool:
+        """Re-read tu's files from disk in place, keeping its parse options.
+
+        TranslationUnit.reparse() discards libclang's status, on failure the
+        TU is unusable, so call it directly.
+        """
+        return conf.lib.clang_reparseTranslationUnit(tu, 0, 0, 0) == 0
+
+    @property
+    def cache_id(self) -> str:
+        # Results depend on the compile args (defines, include paths, std)
+        args = hashlib.blake2b(
+            "\0".join(self._compile_args).encode(), digest_size=8
+        ).hexdigest()
+        return f"{self.__class__.__name__}:{args}"
+
+    def worker_factory(self) -> WorkerFactory:
+        return WorkerFactory(
+            functools.partial(
+                type(self), compile_args=list(self._compile_args), max_tus=self._max_tus
+            ),
+            self.cache_id,
         )
 
+    def invalidate(self, file_path: str) -> None:
+        """Drop cached TUs of file_path (e.g. after one of its headers changed)."""
+        with self._tu_lock:
+            for key in [k for k in self._tu_cache if k[0] == file_path]:
+                del self._tu_cache[key]
+                self._tu_indexes.pop(key, None)
+
     # ---------- interface implementation ----------
 
-    def analyze_file(self, file_path: str) -> AnalysisResult:
+    def analyze_file(self, file_path: str, scope: AnalysisScope = "all") -> AnalysisResult:
+        partial = self._partial_analysis(file_path, scope)
+        if partial is not None:
+            return partial
+
         tu = self._parse(file_path)
-        _, lines = self._read_file(file_path)
+        content = self._read_bytes(file_path)
+
+        # One AST walk for all cursor-based extractors
+        buckets = self._walk_file(tu, self._analysis_handlers)
+
+        directives = self._scan_directives(content)
+
+        return self._result(file_path, buckets, directives)
+
+    def analyze_files(
+        self,
+        paths: Iterable[str],
+        max_workers: int | None = None
+    ) -> dict[str, AnalysisResult]:
+        """Analyze many files on a thread pool, one libclang Index per worker.
+
+        libclang releases the GIL while parsing, which dominates the cost.
+        For Python-heavy batches use CachedAnalyzer.analyze_paths, which
+        fans out to processes instead.
+        """
+        unique = list(dict.fromkeys(paths))
+        with ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=self._init_worker_thread,
+        ) as pool:
+            return dict(zip(unique, pool.map(self.analyze_file, unique)))
+
+    def _init_worker_thread(self) -> None:
+        _thread_state.index = self._Index.create()
+
+    @staticmethod
+    def _in_main_file():
+        """Return a predicate telling whether a cursor is located in its TU's main file.
+
+        Every TU here is parsed from the analyzed file, so one libclang call
+        answers it without building File objects or comparing names.
+        """
+        is_main = _is_from_main_file()
+
+        def in_main_file(cursor) -> bool:
+            return bool(is_main(cursor.location))
+
+        return in_main_file
+
+    def _iter_file_cursors(self, tu) -> list:
+        """Preorder list of the cursors under top-level declarations of the main file.
+
+        Included headers show up as top-level cursors, so system-header
+        declarations are pruned with one check each.
+        """
+        main_file_children, subtree = _file_visitors()
+        visit = conf.lib.clang_visitChildren
+
+        top_level: list = []
+        visit(tu.cursor, main_file_children, (tu, top_level.append))
+
+        cursors: list = []
+        data = (tu, cursors.append)
+        for child in top_level:
+            cursors.append(child)
+            visit(child, subtree, data)
+        return cursors
+
+    def _walk_file(self, tu, handlers: dict) -> dict[str, list]:
+        """Walk the TU once, dispatching cursors located in its main file by kind."""
+        # The TU spelling is the path it was parsed from
+        file_path = tu.spelling
+        in_main_file = self._in_main_file()
+        buckets: dict[str, list] = {
+            "functions": [],
+            "structs": [],
+            "enums": [],
+            "typedefs": [],
+        }
 
-        functions = self.list_functions(file_path)
-        includes = self._extract_includes_from_lines(lines)
-        defines = self._extract_defines_from_lines(lines)
-        conditionals = self._extract_conditionals(lines)
-        structs = self._extract_structs(tu, file_path)
-        enums = self._extract_enums(tu, file_path)
-        typedefs = self._extract_typedefs(tu, file_path)
+        for cursor in self._iter_file_cursors(tu):
+            handler = handlers.get(cursor.kind)
+            if handler is None:
+                continue
+            if in_main_file(cursor):
+                handler(cursor, file_path, buckets)
+
+        return buckets
+
+    def _handle_function(self, cursor, file_path: str, buckets: dict[str, list]) -> None:
+        if cursor.is_definition():
+            buckets["functions"].append(self._parse_function(cursor, file_path))
+
+    def _handle_struct(self, cursor, file_path: str, buckets: dict[str, list]) -> None:
+        if cursor.is_definition():
+            buckets["structs"].append(StructInfo(
+                name=cursor.spelling,
+                line=cursor.location.line,
+                end_line=cursor.extent.end.line,
+            ))
+
+    def _handle_enum(self, cursor, file_path: str, buckets: dict[str, list]) -> None:
+        buckets["enums"].append(EnumInfo(
+            name=cursor.spelling,
+            line=cursor.location.line,
+        ))
 
-        return AnalysisResult(
-            file_path=file_path,
-            functions=functions,
-            includes=includes,
-            defines=defines,
-            conditionals=conditionals,
-            structs=structs,
-            enums=enums,
-            typedefs=typedefs,
-        )
+    def _handle_typedef(self, cursor, file_path: str, buckets: dict[str, list]) -> None:
+        buckets["typedefs"].append({
+            "name": cursor.spelling,
+            "line": cursor.location.line,
+        })
 
     # ---------- functions ----------
 
     def list_functions(self, file_path: str) -> list[FunctionInfo]:
-        import os
         tu = self._parse(file_path)
-        functions: list[FunctionInfo] = []
-        abs_path = os.path.abspath(file_path)
-
-        for cursor in tu.cursor.walk_preorder():
-            if cursor.kind == self._CursorKind.FUNCTION_DECL and cursor.is_definition():
-                # Only include functions defined in the target file
-                if cursor.location.file and os.path.abspath(cursor.location.file.name) == abs_path:
-                    functions.append(self._parse_function(cursor, file_path))
-
-        return functions
+        # Only include functions defined in the target file
+        buckets = self._walk_file(tu, self._function_handlers)
+        return buckets["functions"]
 
     def _parse_function(self, cursor, file_path: str) -> FunctionInfo:
+        # Type spellings repeat across a file, interned to share one str each
         params = [
-            {"type": arg.type.spelling, "name": arg.spelling}
+            Parameter(intern(arg.type.spelling), arg.spelling)
             for arg in cursor.get_arguments()
         ]
 
+        # Each property is a libclang round trip, read every one once
+        extent = cursor.extent
         return FunctionInfo(
             name=cursor.spelling,
             signature=cursor.displayname,
-            start_line=cursor.extent.start.line,
-            end_line=cursor.extent.end.line,
-            return_type=cursor.result_type.spelling,
+            start_line=extent.start.line,
+            end_line=extent.end.line,
+            return_type=intern(cursor.result_type.spelling),
             parameters=params,
             doc_comment=cursor.raw_comment,
             file_path=file_path,
         )
 
     def get_function_body(self, file_path: str, function_name: str) -> str | None:
-        tu = self._parse(file_path)
-
-        for cursor in tu.cursor.walk_preorder():
-            if (
-                cursor.kind == self._CursorKind.FUNCTION_DECL
-                and cursor.spelling == function_name
-                and cursor.is_definition()
-            ):
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                start = cursor.extent.start.line - 1
-                end = cursor.extent.end.line
-                return "".join(lines[start:end])
-
-        return None
+        cursor = self._find_definition(file_path, function_name)
+        if cursor is None:
+            return None
+
+        # The whole lines of the extent, sliced by byte offset so the file
+        # is never split into lines
+        content = self._read_bytes(file_path)
+        extent = cursor.extent
+        start = content.rfind(b"\n", 0, extent.start.offset) + 1
+        end = content.find(b"\n", extent.end.offset)
+        body = content[start:] if end == -1 else content[start:end + 1]
+        # Same text a text-mode readlines() would give
+        return body.decode("utf-8").replace("\r\n", "\n")
+
+    def _tu_index(self, file_path: str) -> tuple[Any, dict[str, dict]]:
+        """Return (TU, lazily filled name indexes) for the full TU of file_path."""
+        key, tu = self._parse_keyed(file_path)
+        with self._tu_lock:
+            index = self._tu_indexes.get(key)
+            if index is None:
+                index = {}
+                # Skip TUs evicted meanwhile, their index would never be dropped
+                if key in self._tu_cache:
+                    self._tu_indexes[key] = index
+        return tu, index
+
+    def _find_definition(self, file_path: str, function_name: str):
+        """Return the definition cursor of function_name, or None."""
+        tu, index = self._tu_index(file_path)
+        functions = index.get("functions")
+        if functions is None:
+            # C function definitions are always at file scope
+            function_decl = self._CursorKind.FUNCTION_DECL
+            functions = index["functions"] = {}
+            for cursor in tu.cursor.get_children():
+                if cursor.kind == function_decl and cursor.is_definition():
+                    functions.setdefault(cursor.spelling, cursor)
+        return functions.get(function_name)
+
+    @staticmethod
+    def _iter_subtree(cursor) -> list:
+        """Preorder list of cursor and its descendants."""
+        nodes = [cursor]
+        conf.lib.clang_visitChildren(cursor, _file_visitors()[1], (cursor._tu, nodes.append))
+        return nodes
 
     # ---------- advanced tools ----------
 
     def get_call_graph(self, file_path: str) -> dict[str, list[str]]:
         tu = self._parse(file_path)
         graph: dict[str, set[str]] = {}
-        current_function = None
+        # Bound set.add of the current function's callees
+        add_callee = None
 
-        for cursor in tu.cursor.walk_preorder():
-            if cursor.kind == self._CursorKind.FUNCTION_DECL and cursor.is_definition():
-                current_function = cursor.spelling
-                graph.setdefault(current_function, set())
+        # Resolve kinds once, each cursor.kind is an FFI-backed lookup
+        function_decl = self._CursorKind.FUNCTION_DECL
+        call_expr = self._CursorKind.CALL_EXPR
 
-            elif (
-                cursor.kind == self._CursorKind.CALL_EXPR
-                and current_function
-                and cursor.referenced
-            ):
-                graph[current_function].add(cursor.referenced.spelling)
+        for cursor in self._iter_file_cursors(tu):
+            kind = cursor.kind
+            if kind == function_decl:
+                if cursor.is_definition():
+                    add_callee = graph.setdefault(cursor.spelling, set()).add
+
+            elif kind == call_expr and add_callee is not None:
+                if (ref := cursor.referenced) is not None:
+                    add_callee(ref.spelling)
 
         return {k: sorted(v) for k, v in graph.items()}
 
     def list_globals(self, file_path: str) -> list[dict[str, Any]]:
-        tu = self._parse(file_path)
+        tu = self._parse(file_path, skip_function_bodies=True)
         globals_ = []
+        in_main_file = self._in_main_file()
+
+        # tu.cursor is an FFI call per access
+        root = tu.cursor
+        var_decl = self._CursorKind.VAR_DECL
 
-        for cursor in tu.cursor.get_children():
-            if cursor.kind == self._CursorKind.VAR_DECL and cursor.semantic_parent == tu.cursor:
+        for cursor in root.get_children():
+            if (
+                cursor.kind == var_decl
+                and cursor.semantic_parent == root
+                and in_main_file(cursor)
+            ):
                 globals_.append({
                     "name": cursor.spelling,
                     "type": cursor.type.spelling,
@@ -152,139 +479,17 @@ class ClangAnalyzer(BaseAnalyzer):
 
         return globals_
 
-    # ---------- preprocess / types ----------
-
-    def _extract_includes_from_lines(self, lines: list[str]) -> list[PreprocessorDirective]:
-        """Extract #include directives by parsing source lines."""
-        includes = []
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped.startswith('#include'):
-                includes.append(PreprocessorDirective(
-                    type='include',
-                    content=stripped,
-                    line=i + 1
-                ))
-        return includes
-
-    def _extract_includes(self, tu) -> list[PreprocessorDirective]:
-        includes = []
-        for inc in tu.get_includes():
-            includes.append(
-                PreprocessorDirective(
-                    type="include",
-                    content=str(inc.include),
-                    line=inc.location.line,
-                )
-            )
-        return includes
-
-    def _extract_defines(self, tu) -> list[PreprocessorDirective]:
-        # libclang não expõe macros facilmente
-        return []
-
-    def _extract_structs(self, tu, file_path: str) -> list[dict[str, Any]]:
-        import os
-        abs_path = os.path.abspath(file_path)
-        structs = []
-        for cursor in tu.cursor.walk_preorder():
-            if cursor.kind == self._CursorKind.STRUCT_DECL and cursor.is_definition():
-                if cursor.location.file and os.path.abspath(cursor.location.file.name) == abs_path:
-                    structs.append({
-                        "name": cursor.spelling,
-                        "line": cursor.location.line,
-                    })
-        return structs
-
-    def _extract_enums(self, tu, file_path: str) -> list[dict[str, Any]]:
-        import os
-        abs_path = os.path.abspath(file_path)
-        enums = []
-        for cursor in tu.cursor.walk_preorder():
-            if cursor.kind == self._CursorKind.ENUM_DECL:
-                if cursor.location.file and os.path.abspath(cursor.location.file.name) == abs_path:
-                    enums.append({
-                        "name": cursor.spelling,
-                        "line": cursor.location.line,
-                    })
-        return enums
-
-    def _extract_typedefs(self, tu, file_path: str) -> list[dict[str, Any]]:
-        import os
-        abs_path = os.path.abspath(file_path)
-        typedefs = []
-        for cursor in tu.cursor.walk_preorder():
-            if cursor.kind == self._CursorKind.TYPEDEF_DECL:
-                if cursor.location.file and os.path.abspath(cursor.location.file.name) == abs_path:
-                    typedefs.append({
-                        "name": cursor.spelling,
-                        "line": cursor.location.line,
-                    })
-        return typedefs
-
     # ---------- preprocessor directives ----------
 
     def get_preprocessor_directives(self, file_path: str) -> dict[str, list[PreprocessorDirective]]:
         """Returns all preprocessor directives."""
-        _, lines = self._read_file(file_path)
-
-        includes = self._extract_includes_from_lines(lines)
-        defines = self._extract_defines_from_lines(lines)
-        conditionals = self._extract_conditionals(lines)
-
-        return {
-            "includes": includes,
-            "defines": defines,
-            "conditionals": conditionals,
-        }
-
-    def _extract_defines_from_lines(self, lines: list[str]) -> list[PreprocessorDirective]:
-        """Extract #define directives by parsing source lines."""
-        defines = []
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped.startswith('#define'):
-                rest = stripped[7:].strip()
-
-                space_idx = rest.find(' ')
-                tab_idx = rest.find('\t')
-                paren_idx = rest.find('(')
-
-                delimiters = [idx for idx in [space_idx, tab_idx, paren_idx] if idx != -1]
-                end_idx = min(delimiters) if delimiters else len(rest)
-
-                name = rest[:end_idx] if end_idx > 0 else rest
-                value = rest[end_idx:].strip() if end_idx < len(rest) else None
-
-                defines.append(PreprocessorDirective(
-                    type='define',
-                    content=name,
-                    line=i + 1,
-                    value=value
-                ))
-        return defines
-
-    def _extract_conditionals(self, lines: list[str]) -> list[PreprocessorDirective]:
-        """Extract #if, #ifdef, #ifndef, #else, #endif."""
-        conditionals = []
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            for directive in ['#ifdef', '#ifndef', '#if', '#elif', '#else', '#endif']:
-                if stripped.startswith(directive):
-                    conditionals.append(PreprocessorDirective(
-                        type=directive[1:],
-                        content=stripped,
-                        line=i + 1
-                    ))
-                    break
-        return conditionals
+        content = self._read_bytes(file_path)
+        return self._scan_directives(content)
 
     # ---------- advanced tools ----------
 
     def get_function_dependencies(self, file_path: str, function_name: str) -> dict[str, Any]:
         """Return structural dependencies of a function."""
-        tu = self._parse(file_path)
-
         deps: dict[str, Any] = {
             "function": function_name,
             "calls": set(),
@@ -292,35 +497,28 @@ class ClangAnalyzer(BaseAnalyzer):
             "macros": set(),
         }
 
-        def traverse(cursor, active=False):
-            if cursor.kind == self._CursorKind.FUNCTION_DECL and cursor.is_definition():
-                active = cursor.spelling == function_name
-
-            if not active:
-                for child in cursor.get_children():
-                    traverse(child, active)
-                return
-
-            if cursor.kind == self._CursorKind.CALL_EXPR and cursor.referenced:
-                deps["calls"].add(cursor.referenced.spelling)
+        fn = self._find_definition(file_path, function_name)
+        if fn is not None:
+            call_expr = self._CursorKind.CALL_EXPR
+            type_ref = self._CursorKind.TYPE_REF
+            decl_ref_expr = self._CursorKind.DECL_REF_EXPR
+
+            for cursor in self._iter_subtree(fn):
+                kind = cursor.kind
+                if kind == call_expr:
+                    if (ref := cursor.referenced) is not None:
+                        deps["calls"].add(ref.spelling)
+                elif kind == type_ref:
+                    deps["types"].add(cursor.spelling)
+                elif kind == decl_ref_expr:
+                    text = cursor.spelling
+                    if text.isupper():
+                        deps["macros"].add(text)
 
-            if cursor.kind == self._CursorKind.TYPE_REF:
-                deps["types"].add(cursor.spelling)
-
-            text = cursor.spelling
-            if cursor.kind == self._CursorKind.DECL_REF_EXPR and text.isupper():
-                deps["macros"].add(text)
-
-            for child in cursor.get_children():
-                traverse(child, active)
-
-        traverse(tu.cursor)
         return {k: sorted(v) if isinstance(v, set) else v for k, v in deps.items()}
 
     def summarize_function(self, file_path: str, function_name: str) -> dict[str, Any]:
         """Return heuristic structural summary of a function."""
-        tu = self._parse(file_path)
-
         summary = {
             "function": function_name,
             "allocates_memory": False,
@@ -329,92 +527,84 @@ class ClangAnalyzer(BaseAnalyzer):
             "uses_goto": False,
         }
 
-        return_count = 0
-
-        def traverse(cursor, active=False):
-            nonlocal return_count
-
-            if cursor.kind == self._CursorKind.FUNCTION_DECL and cursor.is_definition():
-                active = cursor.spelling == function_name
-
-            if not active:
-                for child in cursor.get_children():
-                    traverse(child, active)
-                return
+        fn = self._find_definition(file_path, function_name)
+        if fn is None:
+            return summary
 
-            if cursor.kind == self._CursorKind.CALL_EXPR and cursor.referenced:
-                name = cursor.referenced.spelling
-                if name == "malloc":
-                    summary["allocates_memory"] = True
-                if name == "free":
-                    summary["frees_memory"] = True
+        call_expr = self._CursorKind.CALL_EXPR
+        return_stmt = self._CursorKind.RETURN_STMT
+        goto_stmt = self._CursorKind.GOTO_STMT
+        return_count = 0
 
-            if cursor.kind == self._CursorKind.RETURN_STMT:
+        for cursor in self._iter_subtree(fn):
+            kind = cursor.kind
+            if kind == call_expr:
+                if (ref := cursor.referenced) is not None:
+                    name = ref.spelling
+                    if name == "malloc":
+                        summary["allocates_memory"] = True
+                    if name == "free":
+                        summary["frees_memory"] = True
+            elif kind == return_stmt:
                 return_count += 1
                 if return_count > 1:
                     summary["multiple_returns"] = True
-
-            if cursor.kind == self._CursorKind.GOTO_STMT:
+            elif kind == goto_stmt:
                 summary["uses_goto"] = True
 
-            for child in cursor.get_children():
-                traverse(child, active)
-
-        traverse(tu.cursor)
         return summary
 
     def find_symbol(self, file_path: str, symbol: str) -> dict[str, Any]:
         """Find symbol occurrences in file."""
-        tu = self._parse(file_path)
+        tu, index = self._tu_index(file_path)
+        symbols = index.get("symbols")
+        if symbols is None:
+            # One walk answers every later symbol query on this TU.
+            # Header cursors report lines of another file, so skip them as well
+            symbols = index["symbols"] = {}
+            for cursor in self._iter_file_cursors(tu):
+                line = cursor.location.line
+                lines = symbols.get(spelling := cursor.spelling)
+                if lines is None:
+                    symbols[spelling] = [line]
+                else:
+                    lines.append(line)
 
         result: dict[str, Any] = {
             "symbol": symbol,
-            "lines": []
+            "lines": list(symbols.get(symbol, ()))
         }
 
-        for cursor in tu.cursor.walk_preorder():
-            if cursor.spelling == symbol:
-                result["lines"].append(cursor.location.line)
-
         return result
 
     def get_error_handling_paths(self, file_path: str, function_name: str) -> list[dict[str, Any]]:
         """Detect error-handling patterns in a function."""
-        tu = self._parse(file_path)
-
         errors: list[dict[str, Any]] = []
 
-        def traverse(cursor, active=False):
-            if cursor.kind == self._CursorKind.FUNCTION_DECL and cursor.is_definition():
-                active = cursor.spelling == function_name
+        fn = self._find_definition(file_path, function_name)
+        if fn is None:
+            return errors
 
-            if not active:
-                for child in cursor.get_children():
-                    traverse(child, active)
-                return
+        return_stmt = self._CursorKind.RETURN_STMT
+        goto_stmt = self._CursorKind.GOTO_STMT
 
-            if cursor.kind == self._CursorKind.RETURN_STMT:
+        for cursor in self._iter_subtree(fn):
+            kind = cursor.kind
+            if kind == return_stmt:
                 errors.append({
                     "line": cursor.location.line,
                     "type": "return"
                 })
-
-            if cursor.kind == self._CursorKind.GOTO_STMT:
+            elif kind == goto_stmt:
                 errors.append({
                     "line": cursor.location.line,
                     "type": "goto"
                 })
 
-            for child in cursor.get_children():
-                traverse(child, active)
-
-        traverse(tu.cursor)
         return errors
 
     def list_side_effects(self, file_path: str, function_name: str) -> dict[str, Any]:
         """List side effects of a function."""
-        tu = self._parse(file_path)
-
         effects: dict[str, Any] = {
             "io": set(),
             "allocates_memory": False
@@ -422,25 +612,17 @@ class ClangAnalyzer(BaseAnalyzer):
 
         io_calls = {"printf", "write", "send"}
 
-        def traverse(cursor, active=False):
-            if cursor.kind == self._CursorKind.FUNCTION_DECL and cursor.is_definition():
-                active = cursor.spelling == function_name
-
-            if not active:
-                for child in cursor.get_children():
-                    traverse(child, active)
-                return
-
-            if cursor.kind == self._CursorKind.CALL_EXPR and cursor.referenced:
-                name = cursor.referenced.spelling
-                if name in io_calls:
-                    effects["io"].add(name)
-                if name == "malloc":
-                    effects["allocates_memory"] = True
+        fn = self._find_definition(file_path, function_name)
+        if fn is not None:
+            call_expr = self._CursorKind.CALL_EXPR
 
-            for child in cursor.get_children():
-                traverse(child, active)
+            for cursor in self._iter_subtree(fn):
+                if cursor.kind == call_expr and (ref := cursor.referenced) is not None:
+                    name = ref.spelling
+                    if name in io_calls:
+                        effects["io"].add(name)
+                    if name == "malloc":
+                        effects["allocates_memory"] = True
 
-        traverse(tu.cursor)
         effects["io"] = sorted(effects["io"])
         return effects
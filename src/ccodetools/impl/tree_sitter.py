@@ -1,145 +1,709 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from operator import attrgetter
+from sys import intern
 from typing import Any
-from ..interface import AnalysisResult, FunctionInfo, PreprocessorDirective
-from .base import BaseAnalyzer
+from ..interface import (
+    AnalysisResult, AnalysisScope, EnumInfo, FunctionInfo, Parameter, PreprocessorDirective, StructInfo,
+)
+from .base import BaseAnalyzer, WorkerFactory, stat_fingerprint
+
+
+_start_byte = attrgetter('start_byte')
+
+# Call names compared against node text without decoding it
+_IO_CALLS = frozenset({b'printf', b'write', b'send'})
+_MALLOC = b'malloc'
+_FREE = b'free'
+
+
+@dataclass(slots=True)
+class _FunctionScan:
+    """Features of one function collected in a single walk of its definitions."""
+    calls: set[bytes] = field(default_factory=set)
+    types: set[bytes] = field(default_factory=set)
+    macros: set[bytes] = field(default_factory=set)
+    # (line, "return" | "goto") in source order
+    exits: list[tuple[int, str]] = field(default_factory=list)
+    return_count: int = 0
+
+
+# Patterns 0 and 1 capture the name (and parameters) of the common
+# declarator shapes; pattern 2 catches every other definition.
+_FUNCTION_PATTERNS = """
+    (function_definition
+      declarator: (function_declarator
+        declarator: (identifier) @name
+        parameters: (parameter_list) @params)) @fn
+    (function_definition
+      declarator: (pointer_declarator
+        declarator: (function_declarator
+          declarator: (identifier) @name))) @fn
+    (function_definition) @fn
+"""
+
+# Tree-sitter query sources, compiled once per process by _c_language()
+_QUERY_SOURCES = {
+    'id': '(identifier) @id',
+    'fn': _FUNCTION_PATTERNS,
+    # analyze_file gets functions and types from one run; list_functions
+    # keeps the function-only query, headers have many struct references
+    'defs': _FUNCTION_PATTERNS + """
+    (struct_specifier) @struct
+    (enum_specifier) @enum
+    (type_definition) @typedef
+    """,
+    'call': '(function_definition) @fn (call_expression function: (identifier) @callee)',
+    # What _scan_function collects inside one definition
+    'scan': """
+    (call_expression function: (identifier) @call)
+    (type_identifier) @type
+    (identifier) @id
+    (return_statement) @return
+    (goto_statement) @goto
+    """,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _c_language():
+    """(Language, {name: Query}) shared by every analyzer.
+
+    Compiling a query takes milliseconds; Language and Query objects are
+    immutable, and matching state lives in a per-call QueryCursor, so
+    sharing them across analyzers and threads is safe.
+    """
+    from tree_sitter import Language, Query
+    import tree_sitter_c
+
+    language = Language(tree_sitter_c.language())
+    return language, {name: Query(language, source) for name, source in _QUERY_SOURCES.items()}
+
+
+def _lines_before(content: bytes, offset: int):
+    """(start, line) of the lines above the one containing offset, nearest first."""
+    end = content.rfind(b'\n', 0, offset)
+    while end >= 0:
+        start = content.rfind(b'\n', 0, end) + 1
+        yield start, content[start:end]
+        end = start - 1
+
+
+def _block_comment_start(content: bytes, offset: int) -> int:
+    """Start of the nearest line above offset that opens a block comment, 0 if none."""
+    while True:
+        opening = content.rfind(b'/*', 0, offset)
+        if opening < 0:
+            return 0
+        start = content.rfind(b'\n', 0, opening) + 1
+        if content[start:opening + 2].lstrip().startswith(b'/*'):
+            return start
+        # '/*' after other text on its line, look further up
+        offset = start
+
+
+def _read_span(file_path: str, start: int, end: int) -> bytes:
+    """Bytes [start, end) of file_path, without reading the rest."""
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if hasattr(os, 'pread'):
+            return os.pread(fd, end - start, start)
+        os.lseek(fd, start, os.SEEK_SET)
+        return os.read(fd, end - start)
+    finally:
+        os.close(fd)
+
+
+# Per-thread Parser for analyze_files workers; other threads use the analyzer's one
+_thread_state = threading.local()
+
+# Nodes whose children are top-level code (searched by get_function_body)
+_TOP_LEVEL_CONTAINERS = frozenset((
+    'translation_unit',
+    'preproc_if', 'preproc_ifdef', 'preproc_elif', 'preproc_elifdef', 'preproc_else',
+))
+
+# Block size for prefix/suffix comparison of old and new file content
+_DIFF_BLOCK = 4096
+
+
+def _common_prefix(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common prefix of a and b, at most limit."""
+    i = 0
+    while i + _DIFF_BLOCK <= limit and a[i:i + _DIFF_BLOCK] == b[i:i + _DIFF_BLOCK]:
+        i += _DIFF_BLOCK
+    # Binary search inside the first differing block
+    lo, hi = i, min(i + _DIFF_BLOCK, limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[i:mid] == b[i:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common suffix of a and b, at most limit."""
+    la, lb = len(a), len(b)
+    i = 0
+    while i + _DIFF_BLOCK <= limit and a[la - i - _DIFF_BLOCK:la - i] == b[lb - i - _DIFF_BLOCK:lb - i]:
+        i += _DIFF_BLOCK
+    lo, hi = i, min(i + _DIFF_BLOCK, limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - i] == b[lb - mid:lb - i]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _point(content: bytes, offset: int) -> tuple[int, int]:
+    """(row, column) of a byte offset, as tree-sitter counts them."""
+    row = content.count(b'\n', 0, offset)
+    return row, offset - (content.rfind(b'\n', 0, offset) + 1)
+
+
+def _content_edit(old: bytes, new: bytes) -> dict[str, Any] | None:
+    """Tree.edit() arguments for the single span that differs, None if equal."""
+    limit = min(len(old), len(new))
+    start = _common_prefix(old, new, limit)
+    if start == len(old) == len(new):
+        return None
+    suffix = _common_suffix(old, new, limit - start)
+    old_end = len(old) - suffix
+    new_end = len(new) - suffix
+    return {
+        'start_byte': start,
+        'old_end_byte': old_end,
+        'new_end_byte': new_end,
+        'start_point': _point(old, start),
+        'old_end_point': _point(old, old_end),
+        'new_end_point': _point(new, new_end),
+    }
 
 
 class TreeSitterAnalyzer(BaseAnalyzer):
     """Implementation using tree-sitter"""
 
-    def __init__(self)->None:
+    def __init__(self, max_trees: int = 64)->None:
         try:
-            from tree_sitter import Language, Parser
-            import tree_sitter_c
-
-            self.c_language = Language(tree_sitter_c.language())
-            self.parser = Parser(self.c_language)
+            from tree_sitter import Parser, QueryCursor
+            import tree_sitter_c  # noqa: F401
         except ImportError:
             raise ImportError(
                 "tree-sitter is not installed. Execute: "
                 "pip install tree-sitter tree-sitter-c"
             )
+        self._Parser = Parser
+        self._QueryCursor = QueryCursor
+        self._max_trees = max_trees
+        # Grammar, parser and queries load on the first parse, so the
+        # directive-only paths never pay for them
+        self._parser_ready = False
+
+        # capture name of the definition query -> analyze_file handler
+        self._analysis_handlers = {
+            'struct': self._handle_struct,
+            'enum': self._handle_enum,
+            'typedef': self._handle_typedef,
+        }
+
+        # LRU cache of parsed trees (read-only once parsed)
+        # file_path -> (stat fingerprint, content, tree, memo); memo holds
+        # results derived from that tree (function scans, body index)
+        self._tree_cache: OrderedDict[
+            str, tuple[tuple[int, int, int, int], bytes, Any, dict[Any, Any]]
+        ] = OrderedDict()
+        # file_path -> (fingerprint of the tree they apply to, copy of that
+        # tree with the edits reported through edit(), expected new size)
+        self._pending_edits: dict[str, tuple[tuple[int, int, int, int], Any, int]] = {}
+        # file_path -> (fingerprint, {name: body byte span}) of trees evicted
+        # from the cache, so get_function_body can read one body without a
+        # reparse; dropped when the file's tree is cached again
+        self._body_spans: OrderedDict[
+            str, tuple[tuple[int, int, int, int], dict[bytes, tuple[int, int]]]
+        ] = OrderedDict()
+        self._tree_lock = threading.Lock()
+
+    def _ensure_parser(self) -> None:
+        """Load the C grammar, main Parser and precompiled queries once."""
+        if self._parser_ready:
+            return
+        self.c_language, queries = _c_language()
+        self.parser = self._Parser(self.c_language)
+        # Precompiled queries; matching runs in C instead of a Python node walk
+        self._id_query = queries['id']
+        self._fn_query = queries['fn']
+        self._defs_query = queries['defs']
+        self._call_query = queries['call']
+        self._scan_query = queries['scan']
+        self._parser_ready = True
+
+    def _parse(self, file_path: str) -> tuple[bytes, Any]:
+        """Return (content, tree) for file_path, parsing only when it changed.
+
+        A changed file is reparsed incrementally from its previous tree,
+        with the edits reported through edit() or else the span between
+        the common prefix and suffix of old and new content.
+        """
+        self._ensure_parser()
+        fingerprint = stat_fingerprint(file_path)
+        with self._tree_lock:
+            cached = self._tree_cache.get(file_path)
+            if cached is not None and cached[0] == fingerprint:
+                # LRU bump
+                self._tree_cache.move_to_end(file_path)
+                return cached[1], cached[2]
+            pending = self._pending_edits.pop(file_path, None)
+
+        parser = getattr(_thread_state, 'parser', None) or self.parser
+        content = self._read_bytes(file_path)
+        memo: dict[Any, Any] = {}
+        if cached is None:
+            tree = parser.parse(content)
+        else:
+            # File changed: edit a copy of the old tree (other threads may
+            # still be reading it) and reparse incrementally, tree-sitter
+            # reuses every subtree outside the edited span
+            _, old_content, tree, old_memo = cached
+            if pending is not None and pending[0] == cached[0] and pending[2] == len(content):
+                # Edits reported through edit(), no need to diff contents
+                tree = parser.parse(content, pending[1])
+            else:
+                edit = _content_edit(old_content, content)
+                if edit is not None:
+                    tree = tree.copy()
+                    tree.edit(**edit)
+                    tree = parser.parse(content, tree)
+            if tree is cached[2]:
+                # Only the stat changed (touch, checkout of the same
+                # content): the tree and everything derived from it hold
+                memo = old_memo
+            elif tree.root_node.has_error:
+                # Error recovery depends on the previous tree, parse
+                # broken files from scratch so results do not either
+                tree = parser.parse(content)
+
+        with self._tree_lock:
+            self._tree_cache[file_path] = (fingerprint, content, tree, memo)
+            self._tree_cache.move_to_end(file_path)
+            self._body_spans.pop(file_path, None)
+            if len(self._tree_cache) > self._max_trees:
+                evicted, (evicted_fingerprint, _, _, evicted_memo) = self._tree_cache.popitem(last=False)
+                self._pending_edits.pop(evicted, None)
+                self._remember_body_spans(evicted, evicted_fingerprint, evicted_memo)
+        return content, tree
+
+    def _remember_body_spans(self, file_path: str, fingerprint, memo: dict[Any, Any]) -> None:
+        """Keep the body spans of an evicted tree whose definitions were scanned."""
+        definitions = memo.get('definitions')
+        if definitions is None:
+            return
+        spans = {}
+        for name, indices in self._definitions_by_name(definitions, memo).items():
+            for i in indices:
+                body = definitions[i][0].child_by_field_name('body')
+                if body:
+                    spans[name] = (body.start_byte, body.end_byte)
+                    break
+        self._body_spans[file_path] = (fingerprint, spans)
+        # Spans are small, but bound them like the trees
+        if len(self._body_spans) > 8 * self._max_trees:
+            self._body_spans.popitem(last=False)
+
+    def edit(
+        self,
+        file_path: str,
+        start_byte: int,
+        old_end_byte: int,
+        new_end_byte: int,
+        start_point: tuple[int, int],
+        old_end_point: tuple[int, int],
+        new_end_point: tuple[int, int],
+    ) -> None:
+        """Report an edit of file_path, same arguments as Tree.edit().
+
+        Edits accumulate until the changed file is parsed again, which then
+        reuses them instead of diffing old and new content. Ignored when
+        the file has no cached tree.
+        """
+        with self._tree_lock:
+            cached = self._tree_cache.get(file_path)
+            if cached is None:
+                return
+            pending = self._pending_edits.get(file_path)
+            if pending is None or pending[0] != cached[0]:
+                pending = (cached[0], cached[2].copy(), len(cached[1]))
+            tree = pending[1]
+            tree.edit(
+                start_byte=start_byte,
+                old_end_byte=old_end_byte,
+                new_end_byte=new_end_byte,
+                start_point=tuple(start_point),
+                old_end_point=tuple(old_end_point),
+                new_end_point=tuple(new_end_point),
+            )
+            self._pending_edits[file_path] = (
+                cached[0], tree, pending[2] + new_end_byte - old_end_byte
+            )
+
+    def invalidate(self, file_path: str) -> None:
+        """Drop the cached tree of file_path."""
+        with self._tree_lock:
+            self._tree_cache.pop(file_path, None)
+            self._pending_edits.pop(file_path, None)
+            self._body_spans.pop(file_path, None)
     
-    def _extract_comment_before(self, lines: list[str], line_num: int) -> str | None:
-        """Extract comment immediately before a line"""
-        comments = []
-        i = line_num - 2  # linha anterior (0-indexed)
+    def _extract_comment_before(self, content: bytes, offset: int) -> str | None:
+        """Extract comment immediately before the line containing offset"""
+        # Collected bottom-up as bytes with append, reversed and decoded
+        # once at the end
+        comments: list[bytes] = []
+        lines = _lines_before(content, offset)
         
-        while i >= 0:
-            line = lines[i].strip()
-            if line.startswith('//'):
-                comments.insert(0, line[2:].strip())
-                i -= 1
-            elif line.startswith('/*') or '*/' in line:
-                # Comentário de bloco - coleta até encontrar início
-                block = []
-                while i >= 0:
-                    l = lines[i].strip()
-                    block.insert(0, l)
-                    if l.startswith('/*'):
-                        break
-                    i -= 1
+        for start, line in lines:
+            line = line.strip()
+            if line.startswith(b'//'):
+                comments.append(line[2:].strip())
+            elif line.startswith(b'/*') or b'*/' in line:
+                # Comentário de bloco - coleta até encontrar início, found
+                # with rfind instead of stepping up line by line
+                if line.startswith(b'/*'):
+                    block = [line]
+                else:
+                    block_start = _block_comment_start(content, start)
+                    block = [l.strip() for l in content[block_start:start].split(b'\n')]
+                    block[-1] = line
                 # Limpa marcadores de bloco
-                block_text = ' '.join(block)
-                block_text = block_text.replace('/*', '').replace('*/', '').replace('*', '').strip()
-                comments.insert(0, block_text)
+                block_text = b' '.join(block)
+                block_text = block_text.replace(b'/*', b'').replace(b'*/', b'').replace(b'*', b'').strip()
+                comments.append(block_text)
                 break
-            elif line == '':
-                i -= 1
-            else:
+            elif line != b'':
                 break
         
-        return '\n'.join(comments) if comments else None
+        if not comments:
+            return None
+        comments.reverse()
+        return b'\n'.join(comments).decode('utf-8')
     
-    def analyze_file(self, file_path: str) -> AnalysisResult:
-        """Analyze complete C file"""
-        content, lines = self._read_file(file_path)
-        tree = self.parser.parse(content)
+    def analyze_file(self, file_path: str, scope: AnalysisScope = 'all') -> AnalysisResult:
+        """Analyze complete C file ('preproc' scope skips parsing)"""
+        partial = self._partial_analysis(file_path, scope)
+        if partial is not None:
+            return partial
+
+        content, tree = self._parse(file_path)
         
-        functions = self._extract_functions(tree, lines, file_path)
-        includes = self._extract_includes(lines)
-        defines = self._extract_defines(lines)
-        conditionals = self._extract_conditionals(lines)
-        structs = self._extract_structs(tree, lines)
-        enums = self._extract_enums(tree, lines)
-        typedefs = self._extract_typedefs(tree, lines)
+        # One query run for all node-based extractors
+        buckets = self._extract_all(tree, content, file_path)
+        directives = self._scan_directives(content)
         
-        return AnalysisResult(
-            file_path=file_path,
-            functions=functions,
-            includes=includes,
-            defines=defines,
-            conditionals=conditionals,
-            structs=structs,
-            enums=enums,
-            typedefs=typedefs
-        )
+        return self._result(file_path, buckets, directives)
     
+    def analyze_files(
+        self,
+        paths: Iterable[str],
+        max_workers: int | None = None
+    ) -> dict[str, AnalysisResult]:
+        """Analyze many files on a thread pool, one Parser per worker.
+
+        tree-sitter releases the GIL while parsing; the tree walks still
+        hold it. For Python-heavy batches use CachedAnalyzer.analyze_paths,
+        which fans out to processes instead.
+        """
+        unique = list(dict.fromkeys(paths))
+        with ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=self._init_worker_thread,
+        ) as pool:
+            return dict(zip(unique, pool.map(self.analyze_file, unique)))
+
+    def worker_factory(self) -> WorkerFactory:
+        return WorkerFactory(functools.partial(type(self), max_trees=self._max_trees), self.cache_id)
+
+    def _init_worker_thread(self) -> None:
+        self._ensure_parser()
+        _thread_state.parser = self._Parser(self.c_language)
+
+    def _tree_memo(self, file_path: str, tree) -> dict[Any, Any]:
+        """Memo of results derived from tree, dropped with its cache entry."""
+        with self._tree_lock:
+            entry = self._tree_cache.get(file_path)
+        return entry[3] if entry is not None and entry[2] is tree else {}
+
+    def _run_definitions_query(self, query, tree) -> tuple[list[tuple], dict[str, list]]:
+        """Function definitions and struct/enum/typedef nodes matched by query, in document order.
+
+        Definitions are (fn, name node, parameter_list node); name is None
+        when only the catch-all pattern matched and the declarator must be
+        walked. Type nodes are keyed by capture name.
+        """
+        definitions: dict[int, tuple] = {}
+        types: dict[str, list] = {'struct': [], 'enum': [], 'typedef': []}
+        for pattern, captures in self._QueryCursor(query).matches(tree.root_node):
+            fn = captures.get('fn')
+            if fn is None:
+                for capture, nodes in captures.items():
+                    types[capture].append(nodes[0])
+            elif pattern == 2:
+                definitions.setdefault(fn[0].id, (fn[0], None, None))
+            else:
+                params = captures.get('params')
+                definitions[fn[0].id] = (fn[0], captures['name'][0], params[0] if params else None)
+        for nodes in types.values():
+            nodes.sort(key=_start_byte)
+        return sorted(definitions.values(), key=lambda d: d[0].start_byte), types
+
+    def _function_definitions(self, tree, memo: dict[Any, Any] | None = None) -> list[tuple]:
+        """(fn, name node, parameter_list node) of every definition, in document order.
+
+        Kept in memo (the tree's) when given.
+        """
+        if memo is not None:
+            cached = memo.get('definitions')
+            if cached is not None:
+                return cached
+        definitions, _ = self._run_definitions_query(self._fn_query, tree)
+        if memo is not None:
+            memo['definitions'] = definitions
+        return definitions
+
+    def _function_infos(
+        self, definitions: list[tuple], content: bytes, file_path: str,
+        memo: dict[Any, Any],
+    ) -> list[FunctionInfo]:
+        """FunctionInfo of each definition from _function_definitions.
+
+        Built once per tree (list_functions and analyze_file share it);
+        callers get their own list.
+        """
+        cached = memo.get('functions')
+        if cached is not None:
+            return list(cached)
+        functions = []
+        for fn, name_node, params_node in definitions:
+            if name_node is None:
+                func_info = self._parse_function(fn, content, file_path)
+            else:
+                func_info = self._function_info(fn, name_node, params_node, content, file_path)
+            if func_info:
+                functions.append(func_info)
+        memo['functions'] = functions
+        return list(functions)
+
     def list_functions(self, file_path: str) -> list[FunctionInfo]:
         """list only functions"""
-        content, lines = self._read_file(file_path)
-        tree = self.parser.parse(content)
-        return self._extract_functions(tree, lines, file_path)
+        content, tree = self._parse(file_path)
+        memo = self._tree_memo(file_path, tree)
+        definitions = self._function_definitions(tree, memo)
+        return self._function_infos(definitions, content, file_path, memo)
     
+    def count_functions(self, file_path: str) -> int:
+        """Number of functions, counted from the definitions query (no FunctionInfo built)"""
+        _, tree = self._parse(file_path)
+        memo = self._tree_memo(file_path, tree)
+        functions = memo.get('functions')
+        if functions is not None:
+            return len(functions)
+        # Catch-all matches count only when their declarator has a name,
+        # as in _parse_function
+        return sum(
+            1 for fn, name_node, _ in self._function_definitions(tree, memo)
+            if name_node is not None or self._definition_name_node(fn) is not None
+        )
+
     def get_function_body(self, file_path: str, function_name: str) -> str | None:
         """Return body of specific function"""
-        content, lines = self._read_file(file_path)
-        tree = self.parser.parse(content)
-        
-        def find_function(node)->str | None:
+        target = function_name.encode('utf-8')
+        spans = self._body_spans.get(file_path)
+        if spans is not None and spans[0] == stat_fingerprint(file_path):
+            # Tree evicted but its definitions are known: read just the body
+            span = spans[1].get(target)
+            return _read_span(file_path, *span).decode('utf-8') if span else None
+
+        content, tree = self._parse(file_path)
+        memo = self._tree_memo(file_path, tree)
+        key = ('body', target)
+        if key in memo:
+            # Asked before for this tree (None included): no walk, no decode
+            return memo[key]
+        body = self._find_body(tree, target, memo)
+        memo[key] = text = body.text.decode('utf-8') if body is not None else None
+        return text
+
+    def _find_body(self, tree, target: bytes, memo: dict[Any, Any]):
+        """Body node of the first definition named target, or None."""
+        if 'by_name' not in memo:
+            # Definitions are nearly always top level: look there first and
+            # stop at the match, the index is built only when that fails
+            body = self._top_level_body(tree, target)
+            if body is not None:
+                return body
+
+        definitions = self._function_definitions(tree, memo)
+        for i in self._definitions_by_name(definitions, memo).get(target, ()):
+            body = definitions[i][0].child_by_field_name('body')
+            if body:
+                return body
+        return None
+
+    def _top_level_body(self, tree, target: bytes):
+        """Body of the first top-level definition named target.
+
+        Only preprocessor conditionals are entered, never function bodies.
+        """
+        stack = [tree.root_node]
+        while stack:
+            node = stack.pop()
             if node.type == 'function_definition':
-                declarator = node.child_by_field_name('declarator')
-                if declarator:
-                    name_node = self._get_function_name(declarator)
-                    if name_node and name_node.text.decode('utf-8') == function_name:
-                        body = node.child_by_field_name('body')
-                        if body:
-                            return body.text.decode('utf-8')
-            
-            for child in node.children:
-                result = find_function(child)
-                if result:
-                    return result
-            return None
-        
-        return find_function(tree.root_node)
+                name_node = self._definition_name_node(node)
+                if name_node is not None and name_node.text == target:
+                    return node.child_by_field_name('body')
+            elif node.type in _TOP_LEVEL_CONTAINERS:
+                # reversed so children pop in document order
+                stack.extend(reversed(node.children))
+        return None
     
     def get_preprocessor_directives(self, file_path: str) -> dict[str, list[PreprocessorDirective]]:
         """Retorna diretivas de preprocessador"""
-        _, lines = self._read_file(file_path)
-        
-        return {
-            'includes': self._extract_includes(lines),
-            'defines': self._extract_defines(lines),
-            'conditionals': self._extract_conditionals(lines)
-        }
+        content = self._read_bytes(file_path)
+        return self._scan_directives(content)
     
     def _get_function_name(self, declarator):
         """Extract function name from declarator"""
-        if declarator.type == 'identifier':
+        # Loop down the function/pointer declarator chain, no recursion
+        while declarator is not None and declarator.type in ('function_declarator', 'pointer_declarator'):
+            declarator = declarator.child_by_field_name('declarator')
+        if declarator is not None and declarator.type == 'identifier':
             return declarator
-        elif declarator.type == 'function_declarator':
-            return self._get_function_name(declarator.child_by_field_name('declarator'))
-        elif declarator.type == 'pointer_declarator':
-            return self._get_function_name(declarator.child_by_field_name('declarator'))
         return None
     
-    def _extract_functions(self, tree, lines: list[str], file_path: str) -> list[FunctionInfo]:
-        """Extract all functions"""
-        functions = []
-        
-        def traverse(node):
+    def _declarator_name(self, declarator):
+        """Identifier declared by any (init/pointer/array/function/parenthesized) declarator"""
+        node = declarator
+        while node is not None:
+            if node.type == 'identifier':
+                return node
+            if node.type == 'parenthesized_declarator':
+                node = node.named_children[0] if node.named_child_count else None
+            else:
+                node = node.child_by_field_name('declarator')
+        return None
+
+    def _captures(self, query, tree) -> dict[str, list]:
+        """Run query over the whole tree, each capture list in document order."""
+        captures = self._QueryCursor(query).captures(tree.root_node)
+        for nodes in captures.values():
+            nodes.sort(key=_start_byte)
+        return captures
+
+    def _iter_nodes_with_depth(self, root):
+        """Preorder (node, depth) walk of a tree or a node's subtree, driven by a TreeCursor (no recursion)."""
+        cursor = root.walk()
+        depth = 0
+        while True:
+            yield cursor.node, depth
+            if cursor.goto_first_child():
+                depth += 1
+                continue
+            while not cursor.goto_next_sibling():
+                if not cursor.goto_parent():
+                    return
+                depth -= 1
+
+    def _definition_name_node(self, node):
+        """Name identifier of a function_definition node, None if it has none."""
+        declarator = node.child_by_field_name('declarator')
+        return self._get_function_name(declarator) if declarator else None
+
+    def _definition_name(self, node) -> str | None:
+        """Name of a function_definition node, None if it has none."""
+        name_node = self._definition_name_node(node)
+        return name_node.text.decode() if name_node else None
+
+    def _definitions_by_name(
+        self, definitions: list[tuple], memo: dict[Any, Any] | None = None
+    ) -> dict[bytes, list[int]]:
+        """name -> indices in definitions, document order; kept in memo when given."""
+        if memo is not None:
+            cached = memo.get('by_name')
+            if cached is not None:
+                return cached
+        by_name: dict[bytes, list[int]] = {}
+        for i, (fn, name_node, _) in enumerate(definitions):
+            if name_node is None:
+                name_node = self._definition_name_node(fn)
+                if name_node is None:
+                    continue
+            by_name.setdefault(name_node.text, []).append(i)
+        if memo is not None:
+            memo['by_name'] = by_name
+        return by_name
+
+    def _function_roots(self, tree, target: bytes, memo: dict[Any, Any] | None = None):
+        """(definition, has nested definitions) of each outermost definition named target.
+
+        Definitions come from the definition query, so only their
+        subtrees are looked at, not the whole file.
+        """
+        definitions = self._function_definitions(tree, memo)
+        walked_end = -1
+        for i in self._definitions_by_name(definitions, memo).get(target, ()):
+            fn = definitions[i][0]
+            if fn.start_byte < walked_end:
+                # nested in a definition already visited
+                continue
+            walked_end = fn.end_byte
+            yield fn, i + 1 < len(definitions) and definitions[i + 1][0].start_byte < walked_end
+
+    def _iter_scoped_nodes(self, root, target: bytes):
+        """Preorder nodes of root's subtree that belong to a definition named target."""
+        scopes: list[tuple[int, bool]] = []
+        active = False
+        for node, depth in self._iter_nodes_with_depth(root):
+            if scopes and scopes[-1][0] >= depth:
+                while scopes and scopes[-1][0] >= depth:
+                    scopes.pop()
+                active = scopes[-1][1] if scopes else False
             if node.type == 'function_definition':
-                func_info = self._parse_function(node, lines, file_path)
-                if func_info:
-                    functions.append(func_info)
-            
-            for child in node.children:
-                traverse(child)
-        
-        traverse(tree.root_node)
-        return functions
-    
-    def _parse_function(self, node, lines: list[str], file_path: str) -> FunctionInfo | None:
+                name_node = self._definition_name_node(node)
+                active = name_node is not None and name_node.text == target
+                scopes.append((depth, active))
+            if active:
+                yield node
+
+    def _extract_all(self, tree, content: bytes, file_path: str) -> dict[str, list]:
+        """Functions, structs, enums and typedefs from one definition query run."""
+        memo = self._tree_memo(file_path, tree)
+        types = memo.get('types')
+        if types is None:
+            definitions, types = self._run_definitions_query(self._defs_query, tree)
+            memo.setdefault('definitions', definitions)
+            memo['types'] = types
+        else:
+            definitions = self._function_definitions(tree, memo)
+        buckets: dict[str, list] = {
+            'functions': self._function_infos(definitions, content, file_path, memo),
+            'structs': [],
+            'enums': [],
+            'typedefs': [],
+        }
+
+        for capture, handler in self._analysis_handlers.items():
+            for node in types[capture]:
+                handler(node, content, file_path, buckets)
+
+        return buckets
+
+    def _parse_function(self, node, content: bytes, file_path: str) -> FunctionInfo | None:
         """Parse of a function node"""
         declarator = node.child_by_field_name('declarator')
         if not declarator:
@@ -149,35 +713,43 @@ class TreeSitterAnalyzer(BaseAnalyzer):
         name_node = self._get_function_name(declarator)
         if not name_node:
             return None
+        
+        params_node = None
+        if declarator.type == 'function_declarator':
+            params_node = declarator.child_by_field_name('parameters')
+        return self._function_info(node, name_node, params_node, content, file_path)
+
+    def _function_info(self, node, name_node, params_node, content: bytes, file_path: str) -> FunctionInfo:
+        """Build the FunctionInfo of a definition whose name/parameter nodes are known"""
         name = name_node.text.decode('utf-8')
         
         # Tipo de retorno
         type_node = node.child_by_field_name('type')
-        return_type = type_node.text.decode('utf-8') if type_node else 'void'
+        # Type strings repeat across a file ('int', 'char'), interned so
+        # every FunctionInfo/Parameter shares one object per spelling
+        return_type = intern(type_node.text.decode('utf-8')) if type_node else 'void'
         
         # Parâmetros
         parameters = []
-        if declarator.type == 'function_declarator':
-            params_node = declarator.child_by_field_name('parameters')
-            if params_node:
-                for param in params_node.children:
-                    if param.type == 'parameter_declaration':
-                        param_type = param.child_by_field_name('type')
-                        param_declarator = param.child_by_field_name('declarator')
-                        parameters.append({
-                            'type': param_type.text.decode('utf-8') if param_type else '',
-                            'name': param_declarator.text.decode('utf-8') if param_declarator else ''
-                        })
+        if params_node:
+            for param in params_node.named_children:
+                if param.type == 'parameter_declaration':
+                    param_type = param.child_by_field_name('type')
+                    param_declarator = param.child_by_field_name('declarator')
+                    parameters.append(Parameter(
+                        intern(param_type.text.decode('utf-8')) if param_type else '',
+                        param_declarator.text.decode('utf-8') if param_declarator else ''
+                    ))
         
         # Linhas
         start_line = node.start_point[0] + 1
         end_line = node.end_point[0] + 1
         
         # Signature
-        signature = f"{return_type} {name}({', '.join([p['type'] + ' ' + p['name'] for p in parameters])})"
+        signature = f"{return_type} {name}({', '.join(f'{p.type} {p.name}' for p in parameters)})"
         
         # Comentário
-        doc_comment = self._extract_comment_before(lines, start_line)
+        doc_comment = self._extract_comment_before(content, node.start_byte)
         
         return FunctionInfo(
             name=name,
@@ -190,235 +762,166 @@ class TreeSitterAnalyzer(BaseAnalyzer):
             file_path=file_path
         )
     
-    def _extract_includes(self, lines: list[str]) -> list[PreprocessorDirective]:
-        """Extrai #include"""
-        includes = []
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped.startswith('#include'):
-                includes.append(PreprocessorDirective(
-                    type='include',
-                    content=stripped,
-                    line=i + 1
-                ))
-        return includes
-    
-    def _extract_defines(self, lines: list[str]) -> list[PreprocessorDirective]:
-        """Extrai #define"""
-        defines = []
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped.startswith('#define'):
-                # Remove '#define ' prefix
-                rest = stripped[7:].strip()
-
-                # Find where the name ends (space, tab, or opening paren)
-                space_idx = rest.find(' ')
-                tab_idx = rest.find('\t')
-                paren_idx = rest.find('(')
-
-                # Get first delimiter position
-                delimiters = [idx for idx in [space_idx, tab_idx, paren_idx] if idx != -1]
-                end_idx = min(delimiters) if delimiters else len(rest)
-
-                name = rest[:end_idx] if end_idx > 0 else rest
-                value = rest[end_idx:].strip() if end_idx < len(rest) else None
-
-                defines.append(PreprocessorDirective(
-                    type='define',
-                    content=name,
-                    line=i + 1,
-                    value=value
-                ))
-        return defines
-    
-    def _extract_conditionals(self, lines: list[str]) -> list[PreprocessorDirective]:
-        """Extrai #if, #ifdef, #ifndef, #else, #endif"""
-        conditionals = []
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            for directive in ['#ifdef', '#ifndef', '#if', '#elif', '#else', '#endif']:
-                if stripped.startswith(directive):
-                    conditionals.append(PreprocessorDirective(
-                        type=directive[1:],  # Remove '#'
-                        content=stripped,
-                        line=i + 1
-                    ))
-                    break
-        return conditionals
-    
-    def _extract_structs(self, tree, lines: list[str]) -> list[dict[str, Any]]:
-        """Extrai structs"""
-        structs = []
-        
-        def traverse(node):
-            if node.type == 'struct_specifier':
-                name_node = node.child_by_field_name('name')
-                if name_node:
-                    structs.append({
-                        'name': name_node.text.decode('utf-8'),
-                        'line': node.start_point[0] + 1,
-                        'end_line': node.end_point[0] + 1
-                    })
-            
-            for child in node.children:
-                traverse(child)
-        
-        traverse(tree.root_node)
-        return structs
-    
-    def _extract_enums(self, tree, lines: list[str]) -> list[dict[str, Any]]:
-        """Extrai enums"""
-        enums = []
-        
-        def traverse(node):
-            if node.type == 'enum_specifier':
-                name_node = node.child_by_field_name('name')
-                if name_node:
-                    enums.append({
-                        'name': name_node.text.decode('utf-8'),
-                        'line': node.start_point[0] + 1
-                    })
-            
-            for child in node.children:
-                traverse(child)
-        
-        traverse(tree.root_node)
-        return enums
-    
-    def _extract_typedefs(self, tree, lines: list[str]) -> list[dict[str, Any]]:
-        """Extrai typedefs"""
-        typedefs = []
-        
-        def traverse(node):
-            if node.type == 'type_definition':
-                declarator = node.child_by_field_name('declarator')
-                if declarator:
-                    typedefs.append({
-                        'name': declarator.text.decode('utf-8'),
-                        'line': node.start_point[0] + 1
-                    })
-            
-            for child in node.children:
-                traverse(child)
-        
-        traverse(tree.root_node)
-        return typedefs
+    def _handle_struct(self, node, content: bytes, file_path: str, buckets: dict[str, list]) -> None:
+        name_node = node.child_by_field_name('name')
+        if name_node:
+            buckets['structs'].append(StructInfo(
+                name=name_node.text.decode('utf-8'),
+                line=node.start_point[0] + 1,
+                end_line=node.end_point[0] + 1
+            ))
+
+    def _handle_enum(self, node, content: bytes, file_path: str, buckets: dict[str, list]) -> None:
+        name_node = node.child_by_field_name('name')
+        if name_node:
+            buckets['enums'].append(EnumInfo(
+                name=name_node.text.decode('utf-8'),
+                line=node.start_point[0] + 1
+            ))
+
+    def _handle_typedef(self, node, content: bytes, file_path: str, buckets: dict[str, list]) -> None:
+        declarator = node.child_by_field_name('declarator')
+        if declarator:
+            buckets['typedefs'].append({
+                'name': declarator.text.decode('utf-8'),
+                'line': node.start_point[0] + 1
+            })
     
-    def _walk(self, node):
-        yield node
-        for child in node.children:
-            yield from self._walk(child)
-
     def get_call_graph(self, file_path: str) -> dict[str, list[str]]:
-        content, _ = self._read_file(file_path)
-        tree = self.parser.parse(content)
-
-        call_graph: dict[str, set[str]] = {}
-
-        def traverse(node, current_function=None):
-            if node.type == "function_definition":
-                declarator = node.child_by_field_name("declarator")
-                name_node = self._get_function_name(declarator)
-                if name_node:
-                    current_function = name_node.text.decode()
-                    call_graph.setdefault(current_function, set())
-
-            if node.type == "call_expression" and current_function:
+        content, tree = self._parse(file_path)
+
+        # callee names stay bytes until the output is built
+        call_graph: dict[str, set[bytes]] = {}
+
+        captures = self._captures(self._call_query, tree)
+        definitions = captures.get("fn", [])
+        callees = captures.get("callee", [])
+
+        # Calls belong to the innermost enclosing definition that has a name;
+        # both capture lists are in document order, so merge them with a
+        # stack of (end_byte, function) for the open definitions.
+        scopes: list[tuple[int, str | None]] = []
+        i = 0
+        for callee in callees:
+            start = callee.start_byte
+            while i < len(definitions) and definitions[i].start_byte <= start:
+                node = definitions[i]
+                i += 1
+                while scopes and scopes[-1][0] <= node.start_byte:
+                    scopes.pop()
+                name = self._definition_name(node)
+                if name:
+                    call_graph.setdefault(name, set())
+                else:
+                    name = scopes[-1][1] if scopes else None
+                scopes.append((node.end_byte, name))
+            while scopes and scopes[-1][0] <= start:
+                scopes.pop()
+            if scopes and scopes[-1][1]:
+                call_graph[scopes[-1][1]].add(callee.text)
+
+        # definitions after the last call still show up, with no callees
+        for node in definitions[i:]:
+            name = self._definition_name(node)
+            if name:
+                call_graph.setdefault(name, set())
+
+        return {k: [c.decode() for c in sorted(v)] for k, v in call_graph.items()}
+
+    def _scan_function(self, file_path: str, function_name: str) -> _FunctionScan:
+        """Scan of function_name, cached with the file's tree.
+
+        Dependencies, summary, error paths and side effects are all
+        projections of this one scan.
+        """
+        content, tree = self._parse(file_path)
+        memo = self._tree_memo(file_path, tree)
+        scan = memo.get(('scan', function_name))
+        if scan is not None:
+            return scan
+
+        scan = _FunctionScan()
+        target = function_name.encode('utf-8')
+        for fn, nested in self._function_roots(tree, target, memo):
+            if nested:
+                # A nested function_definition (GNU nested functions) opens
+                # its own scope: walk, keeping only nodes of target's scopes
+                self._scan_nodes(scan, self._iter_scoped_nodes(fn, target))
+            else:
+                self._scan_captures(scan, fn)
+
+        memo[('scan', function_name)] = scan
+        return scan
+
+    def _scan_captures(self, scan: _FunctionScan, fn) -> None:
+        """Add one definition to scan from a scan query run over its subtree."""
+        captures = self._QueryCursor(self._scan_query).captures(fn)
+        scan.calls.update(node.text for node in captures.get('call', ()))
+        scan.types.update(node.text for node in captures.get('type', ()))
+        add_macro = scan.macros.add
+        for node in captures.get('id', ()):
+            text = node.text
+            if text.isupper() if text.isascii() else text.decode().isupper():
+                add_macro(text)
+
+        returns = captures.get('return', ())
+        scan.return_count += len(returns)
+        # Captures are not in document order; merge both kinds by position
+        exits = [(node.start_byte, node.start_point[0] + 1, "return") for node in returns]
+        exits += [(node.start_byte, node.start_point[0] + 1, "goto") for node in captures.get('goto', ())]
+        exits.sort()
+        scan.exits.extend((line, kind) for _, line, kind in exits)
+
+    def _scan_nodes(self, scan: _FunctionScan, nodes) -> None:
+        """Add the nodes of a Python walk to scan (same features as _scan_captures)."""
+        add_call = scan.calls.add
+        add_exit = scan.exits.append
+        for node in nodes:
+            node_type = node.type
+            if node_type == "call_expression":
                 fn = node.child_by_field_name("function")
                 if fn and fn.type == "identifier":
-                    call_graph[current_function].add(fn.text.decode())
+                    add_call(fn.text)
+
+            elif node_type == "type_identifier":
+                scan.types.add(node.text)
 
-            for child in node.children:
-                traverse(child, current_function)
+            elif node_type == "identifier":
+                text = node.text
+                if text.isupper() if text.isascii() else text.decode().isupper():
+                    scan.macros.add(text)
 
-        traverse(tree.root_node)
-        return {k: sorted(v) for k, v in call_graph.items()}
+            elif node_type == "return_statement":
+                scan.return_count += 1
+                add_exit((node.start_point[0] + 1, "return"))
+
+            elif node_type == "goto_statement":
+                add_exit((node.start_point[0] + 1, "goto"))
 
     def get_function_dependencies(self, file_path: str, function_name: str) -> dict[str, Any]:
-        content, _ = self._read_file(file_path)
-        tree = self.parser.parse(content)
+        scan = self._scan_function(file_path, function_name)
 
-        deps = {
+        # names were collected as bytes; sorted bytes keep the str order
+        return {
             "function": function_name,
-            "calls": set(),
-            "types": set(),
-            "macros": set(),
+            "calls": [n.decode() for n in sorted(scan.calls)],
+            "types": [n.decode() for n in sorted(scan.types)],
+            "macros": [n.decode() for n in sorted(scan.macros)],
         }
 
-        def traverse(node, active=False):
-            if node.type == "function_definition":
-                declarator = node.child_by_field_name("declarator")
-                name_node = self._get_function_name(declarator)
-                active = name_node and name_node.text.decode() == function_name
-
-            if active:
-                if node.type == "call_expression":
-                    fn = node.child_by_field_name("function")
-                    if fn and fn.type == "identifier":
-                        deps["calls"].add(fn.text.decode())
-
-                if node.type == "type_identifier":
-                    deps["types"].add(node.text.decode())
-
-                if node.type == "identifier" and node.text.decode().isupper():
-                    deps["macros"].add(node.text.decode())
-
-            for child in node.children:
-                traverse(child, active)
-
-        traverse(tree.root_node)
-        return {k: sorted(v) if isinstance(v, set) else v for k, v in deps.items()}
-
     def summarize_function(self, file_path: str, function_name: str) -> dict[str, Any]:
-        content, _ = self._read_file(file_path)
-        tree = self.parser.parse(content)
+        scan = self._scan_function(file_path, function_name)
 
-        summary = {
+        return {
             "function": function_name,
-            "allocates_memory": False,
-            "frees_memory": False,
-            "multiple_returns": False,
-            "uses_goto": False,
+            "allocates_memory": _MALLOC in scan.calls,
+            "frees_memory": _FREE in scan.calls,
+            "multiple_returns": scan.return_count > 1,
+            "uses_goto": any(kind == "goto" for _, kind in scan.exits),
         }
 
-        return_count = 0
-
-        def traverse(node, active=False):
-            nonlocal return_count
-
-            if node.type == "function_definition":
-                declarator = node.child_by_field_name("declarator")
-                name_node = self._get_function_name(declarator)
-                active = name_node and name_node.text.decode() == function_name
-
-            if active:
-                if node.type == "call_expression":
-                    fn = node.child_by_field_name("function")
-                    if fn and fn.type == "identifier":
-                        name = fn.text.decode()
-                        if name == "malloc":
-                            summary["allocates_memory"] = True
-                        if name == "free":
-                            summary["frees_memory"] = True
-
-                if node.type == "return_statement":
-                    return_count += 1
-                    if return_count > 1:
-                        summary["multiple_returns"] = True
-
-                if node.type == "goto_statement":
-                    summary["uses_goto"] = True
-
-            for child in node.children:
-                traverse(child, active)
-
-        traverse(tree.root_node)
-        return summary
-
     def list_globals(self, file_path: str) -> list[dict[str, Any]]:
-        content, _ = self._read_file(file_path)
-        tree = self.parser.parse(content)
+        content, tree = self._parse(file_path)
 
         globals_ = []
 
@@ -426,90 +929,47 @@ class TreeSitterAnalyzer(BaseAnalyzer):
             if node.type == "declaration":
                 declarator = node.child_by_field_name("declarator")
                 if declarator:
+                    # Decode only the declared identifier, not the whole
+                    # declarator (initializer, array size, parameters, ...)
+                    name_node = self._declarator_name(declarator) or declarator
                     globals_.append({
-                        "name": declarator.text.decode(),
+                        "name": name_node.text.decode(),
                         "line": node.start_point[0] + 1
                     })
 
         return globals_
 
     def find_symbol(self, file_path: str, symbol: str) -> dict[str, Any]:
-        content, _ = self._read_file(file_path)
-        tree = self.parser.parse(content)
-    
+        content, tree = self._parse(file_path)
+        memo = self._tree_memo(file_path, tree)
+
+        # identifier -> lines, from one query run per tree
+        symbols = memo.get('symbols')
+        if symbols is None:
+            symbols = {}
+            for node in self._captures(self._id_query, tree).get("id", ()):
+                line = node.start_point[0] + 1
+                lines = symbols.get(text := node.text)
+                if lines is None:
+                    symbols[text] = [line]
+                else:
+                    lines.append(line)
+            memo['symbols'] = symbols
+
         result = {
             "symbol": symbol,
-            "lines": []
+            "lines": list(symbols.get(symbol.encode(), ()))
         }
     
-        for node in self._walk(tree.root_node):
-            if node.type == "identifier" and node.text.decode() == symbol:
-                result["lines"].append(node.start_point[0] + 1)
-    
         return result
     
     def get_error_handling_paths(self, file_path: str, function_name: str) -> list[dict[str, Any]]:
-        content, _ = self._read_file(file_path)
-        tree = self.parser.parse(content)
-    
-        errors = []
-    
-        def traverse(node, active=False):
-            if node.type == "function_definition":
-                declarator = node.child_by_field_name("declarator")
-                name_node = self._get_function_name(declarator)
-                active = name_node and name_node.text.decode() == function_name
-
-            if active:
-                if node.type == "return_statement":
-                    errors.append({
-                        "line": node.start_point[0] + 1,
-                        "type": "return"
-                    })
-
-                if node.type == "goto_statement":
-                    errors.append({
-                        "line": node.start_point[0] + 1,
-                        "type": "goto"
-                    })
-
-            for child in node.children:
-                traverse(child, active)
-
-        traverse(tree.root_node)
-        return errors
+        scan = self._scan_function(file_path, function_name)
+        return [{"line": line, "type": kind} for line, kind in scan.exits]
 
     def list_side_effects(self, file_path: str, function_name: str) -> dict[str, Any]:
-        content, _ = self._read_file(file_path)
-        tree = self.parser.parse(content)
-    
-        effects = {
-            "io": set(),
-            "allocates_memory": False
+        scan = self._scan_function(file_path, function_name)
+        return {
+            "io": sorted(name.decode() for name in scan.calls & _IO_CALLS),
+            "allocates_memory": _MALLOC in scan.calls,
         }
-    
-        io_calls = {"printf", "write", "send"}
-    
-        def traverse(node, active=False):
-            if node.type == "function_definition":
-                declarator = node.child_by_field_name("declarator")
-                name_node = self._get_function_name(declarator)
-                active = name_node and name_node.text.decode() == function_name
-
-            if active:
-                if node.type == "call_expression":
-                    fn = node.child_by_field_name("function")
-                    if fn and fn.type == "identifier":
-                        name = fn.text.decode()
-                        if name in io_calls:
-                            effects["io"].add(name)
-                        if name == "malloc":
-                            effects["allocates_memory"] = True
-
-            for child in node.children:
-                traverse(child, active)
-
-        traverse(tree.root_node)
-        effects["io"] = sorted(effects["io"])
-        return effects
-    
\ No newline at end of file
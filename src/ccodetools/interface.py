@@ -1,7 +1,109 @@
-from typing import Protocol,  Any
-from dataclasses import dataclass
+from collections.abc import Iterable, Mapping
+from typing import Protocol,  Any, Literal, get_args, get_origin
+from dataclasses import dataclass, fields
 
-@dataclass
+# Field types that are copied as-is by the generated to_dict
+_SCALAR_TYPES = (str, int, bool, str | None, int | None)
+
+
+def _plain(value: Any) -> Any:
+    """Convert nested dataclasses / containers to plain JSON-friendly values"""
+    # Exact-type checks first: plain lists/dicts/scalars are the common case
+    # and a failing hasattr() costs an AttributeError per node
+    cls = type(value)
+    if cls is list:
+        return [_plain(v) for v in value]
+    if cls is dict:
+        return {k: _plain(v) for k, v in value.items()}
+    if cls in (str, int, bool, float) or value is None:
+        return value
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+def _field_expr(name: str, tp: Any) -> str:
+    """Source expression converting field `name` of type `tp` to a plain value"""
+    if tp in _SCALAR_TYPES:
+        return f"self.{name}"
+    args = get_args(tp)
+    if get_origin(tp) is list and args and hasattr(args[0], 'to_dict'):
+        # Known element type: no per-element dispatch or recursion
+        return f"[v.to_dict() for v in self.{name}]"
+    return f"_plain(self.{name})"
+
+
+def _with_to_dict(cls: type) -> type:
+    """Attach a generated to_dict() (literal dict, no reflection or deepcopy)"""
+    items = ', '.join(
+        f"{f.name!r}: {_field_expr(f.name, f.type)}" for f in fields(cls)
+    )
+    namespace: dict[str, Any] = {'_plain': _plain}
+    exec(f"def to_dict(self):\n    return {{{items}}}", namespace)
+    setattr(cls, 'to_dict', namespace['to_dict'])
+    return cls
+
+
+class _KeyAccess(Mapping):
+    """Read-only Mapping view of slots records that replaced plain dicts.
+
+    Keeps p['type'], s.get('name'), keys()/items() and == against the old
+    dict literals working; isinstance(x, dict) is False, use Mapping.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is type(self):
+            return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None  # mutable, like the dicts (and dataclasses) before it
+
+
+@_with_to_dict
+@dataclass(slots=True, eq=False)
+class Parameter(_KeyAccess):
+    """Function parameter (a slots object instead of one dict per parameter)"""
+    type: str
+    name: str
+
+
+@_with_to_dict
+@dataclass(slots=True, eq=False)
+class StructInfo(_KeyAccess):
+    """Struct definition (a slots object instead of one dict per struct)"""
+    name: str
+    line: int
+    end_line: int
+
+
+@_with_to_dict
+@dataclass(slots=True, eq=False)
+class EnumInfo(_KeyAccess):
+    """Enum definition (a slots object instead of one dict per enum)"""
+    name: str
+    line: int
+
+
+@_with_to_dict
+@dataclass(slots=True)
 class FunctionInfo:
     """Function Information"""
     name: str
@@ -9,11 +111,12 @@ class FunctionInfo:
     start_line: int
     end_line: int
     return_type: str
-    parameters: list[dict[str, str]]  # [{"type": "int", "name": "x"}, ...]
+    parameters: list[Parameter | dict[str, str]]  # [Parameter("int", "x"), ...]
     doc_comment: str | None = None
     file_path: str | None = None
 
-@dataclass
+@_with_to_dict
+@dataclass(slots=True)
 class PreprocessorDirective:
     """Preprocessor Directives"""
     type: str  # "include", "define", "ifdef", "ifndef", "if", "else", "endif"
@@ -21,7 +124,8 @@ class PreprocessorDirective:
     line: int
     value: str | None = None  # Para defines
 
-@dataclass
+@_with_to_dict
+@dataclass(slots=True)
 class AnalysisResult:
     """Analysis Complete Result"""
     file_path: str
@@ -29,24 +133,37 @@ class AnalysisResult:
     includes: list[PreprocessorDirective]
     defines: list[PreprocessorDirective]
     conditionals: list[PreprocessorDirective]
-    structs: list[dict[str, Any]]
-    enums: list[dict[str, Any]]
+    structs: list[StructInfo | dict[str, Any]]
+    enums: list[EnumInfo | dict[str, Any]]
     typedefs: list[dict[str, Any]]
 
+# Parts of analyze_file to compute: everything, only functions, or only
+# preprocessor directives (the latter never parses the file)
+AnalysisScope = Literal['all', 'functions', 'preproc']
+
+
 class CCodeAnalyzer(Protocol):
     """C Code Analyzer Protocol"""
     
-    def analyze_file(self, file_path: str) -> AnalysisResult:
-        """Analyzes a C file and returns the complete structure"""
+    def analyze_file(self, file_path: str, scope: AnalysisScope = 'all') -> AnalysisResult:
+        """Analyzes a C file and returns the complete structure (or the parts in scope)"""
         ...
     
     def list_functions(self, file_path: str) -> list[FunctionInfo]:
         """List only the functions in the file"""
         ...
+
+    def count_functions(self, file_path: str) -> int:
+        """Number of functions list_functions would return"""
+        ...
     
     def get_function_body(self, file_path: str, function_name: str) -> str|None:
         """Returns the body of a specific function"""
         ...
+
+    def get_functions_by_names(self, file_path: str, names: Iterable[str]) -> dict[str, FunctionInfo]:
+        """FunctionInfo of each requested function defined in the file, by name"""
+        ...
     
     def get_preprocessor_directives(self, file_path: str) -> dict[str, list[PreprocessorDirective]]:
         """Returns all preprocessor directives"""
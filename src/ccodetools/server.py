@@ -1,175 +1,338 @@
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 import mcp.server.stdio
+import anyio
+import os
+import sys
+from io import TextIOWrapper
 from .interface import CCodeAnalyzer
 from .factory import make_analyzer
-import json
+from .impl.cached_analyzer import CachedAnalyzer
+import orjson
 
-analyzer: CCodeAnalyzer = make_analyzer('tree-sitter')
+_analyzer: CCodeAnalyzer | None = None
 
 app = Server("c-code-analyzer")
 
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    return [
-        Tool(
-            name="analyze_c_file",
-            description="Analisa um arquivo C e retorna estrutura completa",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                },
-                "required": ["file_path"]
-            }
-        ),
-
-        Tool(
-            name="list_functions",
-            description="Lista funções com signature, linhas e comentários",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                },
-                "required": ["file_path"]
-            }
-        ),
-
-        Tool(
-            name="get_function_body",
-            description="Retorna o corpo completo de uma função",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                    "function_name": {"type": "string"},
-                },
-                "required": ["file_path", "function_name"]
-            }
-        ),
-
-        Tool(
-            name="get_preprocessor_directives",
-            description="Lista diretivas de preprocessador",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                },
-                "required": ["file_path"]
-            }
-        ),
-
-        Tool(
-            name="get_call_graph",
-            description="Retorna o grafo de chamadas por função",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                },
-                "required": ["file_path"]
-            }
-        ),
-
-        Tool(
-            name="get_function_dependencies",
-            description="Retorna dependências estruturais de uma função",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                    "function_name": {"type": "string"},
-                },
-                "required": ["file_path", "function_name"]
-            }
-        ),
-
-        Tool(
-            name="summarize_function",
-            description="Resumo estrutural heurístico de uma função",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                    "function_name": {"type": "string"},
-                },
-                "required": ["file_path", "function_name"]
-            }
-        ),
-
-        Tool(
-            name="list_globals",
-            description="Lista variáveis globais do arquivo",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                },
-                "required": ["file_path"]
-            }
-        ),
-
-        Tool(
-            name="find_symbol",
-            description="Busca ocorrências de um símbolo no arquivo",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                    "symbol": {"type": "string"},
-                },
-                "required": ["file_path", "symbol"]
-            }
-        ),
-
-        Tool(
-            name="get_error_handling_paths",
-            description="Detecta caminhos de erro em uma função",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                    "function_name": {"type": "string"},
+def get_analyzer() -> CCodeAnalyzer:
+    """Cria o analyzer no primeiro uso (importar o módulo ou listar tools não carrega bindings nativos)
+
+    Os resultados ficam em cache por conteúdo do arquivo: chamadas repetidas
+    sobre um arquivo inalterado não refazem a análise.
+    """
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = CachedAnalyzer(make_analyzer('tree-sitter'))
+    return _analyzer
+
+
+def _to_dict(obj):
+    return obj.to_dict()
+
+
+# CCODETOOLS_DEBUG=1 indenta as respostas para leitura humana
+_JSON_OPTIONS = orjson.OPT_SERIALIZE_DATACLASS | (
+    orjson.OPT_INDENT_2 if os.environ.get("CCODETOOLS_DEBUG") else 0
+)
+
+
+def to_text(obj) -> str:
+    """JSON compacto via orjson (dataclasses serializadas direto, sem indent)"""
+    return orjson.dumps(obj, default=_to_dict, option=_JSON_OPTIONS).decode()
+
+
+# A partir de quantos arquivos fora do cache analyze_c_files usa processos em vez de threads
+_PROCESS_BATCH_MIN = 32
+
+
+# Campos de uma edição, os mesmos de Tree.edit() do tree-sitter
+_EDIT_PROPERTIES = {
+    "start_byte": {"type": "integer"},
+    "old_end_byte": {"type": "integer"},
+    "new_end_byte": {"type": "integer"},
+    "start_point": {"type": "array", "items": {"type": "integer"}},
+    "old_end_point": {"type": "array", "items": {"type": "integer"}},
+    "new_end_point": {"type": "array", "items": {"type": "integer"}},
+}
+
+
+def _analyze_each(analyzer: CCodeAnalyzer, paths) -> dict:
+    """Um arquivo por vez; a falha de um vira {"error": ...} só na entrada dele"""
+    results: dict = {}
+    for p in paths:
+        try:
+            results[p] = analyzer.analyze_file(p)
+        except Exception as e:
+            results[p] = {"error": str(e)}
+    return results
+
+
+def analyze_batch(analyzer: CCodeAnalyzer, paths) -> dict:
+    """Resultado por arquivo de analyze_c_files (síncrono, chamado fora do event loop)
+
+    Caminhos ausentes ou ilegíveis viram {"error": ...} sem derrubar o lote;
+    os demais seguem pelo caminho em lote do analyzer.
+    """
+    results: dict = {}
+    readable = []
+    for p in dict.fromkeys(paths):
+        try:
+            os.close(os.open(p, os.O_RDONLY))
+        except OSError as e:
+            results[p] = {"error": str(e)}
+        else:
+            readable.append(p)
+
+    # Lotes grandes vão para um pool de processos (a extração das
+    # árvores segura o GIL); analyze_paths conta só os arquivos
+    # distintos fora do cache, e abaixo de _PROCESS_BATCH_MIN não
+    # paga o início dos workers e usa threads
+    analyze_paths = getattr(analyzer, "analyze_paths", None)
+    analyze_files = getattr(analyzer, "analyze_files", None)
+    try:
+        if analyze_paths is not None and (os.cpu_count() or 1) > 1:
+            batch = analyze_paths(readable, min_misses=_PROCESS_BATCH_MIN)
+        elif analyze_files is not None:
+            batch = analyze_files(readable)
+        else:
+            batch = _analyze_each(analyzer, readable)
+    except Exception:
+        # Algum arquivo falhou no meio do lote: refaz um a um para
+        # isolar o erro (os que já terminaram estão no cache)
+        batch = _analyze_each(analyzer, readable)
+    results.update(batch)
+    # Mesma ordem dos caminhos pedidos
+    return {p: results[p] for p in dict.fromkeys(paths)}
+
+
+def apply_edits(analyzer: CCodeAnalyzer, file_path: str, edits) -> None:
+    """Repassa edições ao analyzer; só o tree-sitter as usa (parse incremental)"""
+    edit = getattr(analyzer, "edit", None)
+    if edit is not None:
+        for e in edits:
+            edit(file_path, **e)
+
+
+# Montadas uma vez; clientes podem repetir list_tools
+_TOOLS: list[Tool] = [
+    Tool(
+        name="analyze_c_file",
+        description="Analisa um arquivo C e retorna estrutura completa",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "scope": {
+                    "type": "string",
+                    "enum": ["all", "functions", "preproc"],
+                    "description": "Partes da análise; preproc não faz parse do arquivo",
                 },
-                "required": ["file_path", "function_name"]
-            }
-        ),
-
-        Tool(
-            name="list_side_effects",
-            description="Lista efeitos colaterais de uma função",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string"},
-                    "function_name": {"type": "string"},
+                "edits": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": _EDIT_PROPERTIES,
+                        "required": list(_EDIT_PROPERTIES),
+                    },
+                    "description": "Edições desde a última chamada, para o parse incremental",
                 },
-                "required": ["file_path", "function_name"]
-            }
-        ),
-    ]
+            },
+            "required": ["file_path"]
+        }
+    ),
+
+    Tool(
+        name="analyze_c_files",
+        description="Analisa vários arquivos C em paralelo; resultado por arquivo",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "paths": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["paths"]
+        }
+    ),
+
+    Tool(
+        name="list_functions",
+        description="Lista funções com signature, linhas e comentários",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+            },
+            "required": ["file_path"]
+        }
+    ),
+
+    Tool(
+        name="get_function_body",
+        description="Retorna o corpo completo de uma função",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "function_name": {"type": "string"},
+            },
+            "required": ["file_path", "function_name"]
+        }
+    ),
+
+    Tool(
+        name="get_preprocessor_directives",
+        description="Lista diretivas de preprocessador",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+            },
+            "required": ["file_path"]
+        }
+    ),
+
+    Tool(
+        name="get_call_graph",
+        description="Retorna o grafo de chamadas por função",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+            },
+            "required": ["file_path"]
+        }
+    ),
+
+    Tool(
+        name="get_function_dependencies",
+        description="Retorna dependências estruturais de uma função",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "function_name": {"type": "string"},
+            },
+            "required": ["file_path", "function_name"]
+        }
+    ),
+
+    Tool(
+        name="summarize_function",
+        description="Resumo estrutural heurístico de uma função",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "function_name": {"type": "string"},
+            },
+            "required": ["file_path", "function_name"]
+        }
+    ),
+
+    Tool(
+        name="list_globals",
+        description="Lista variáveis globais do arquivo",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+            },
+            "required": ["file_path"]
+        }
+    ),
+
+    Tool(
+        name="find_symbol",
+        description="Busca ocorrências de um símbolo no arquivo",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "symbol": {"type": "string"},
+            },
+            "required": ["file_path", "symbol"]
+        }
+    ),
+
+    Tool(
+        name="get_error_handling_paths",
+        description="Detecta caminhos de erro em uma função",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "function_name": {"type": "string"},
+            },
+            "required": ["file_path", "function_name"]
+        }
+    ),
+
+    Tool(
+        name="list_side_effects",
+        description="Lista efeitos colaterais de uma função",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "function_name": {"type": "string"},
+            },
+            "required": ["file_path", "function_name"]
+        }
+    ),
+
+    Tool(
+        name="notify_c_file_edit",
+        description="Informa uma edição do arquivo (didChange) para o próximo parse ser incremental",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                **_EDIT_PROPERTIES,
+            },
+            "required": ["file_path", *_EDIT_PROPERTIES]
+        }
+    ),
+]
+
+
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    return _TOOLS
 
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     try:
+        analyzer = get_analyzer()
+
         # ===== EXISTENTES =====
 
         if name == "analyze_c_file":
-            result = analyzer.analyze_file(arguments["file_path"])
+            apply_edits(analyzer, arguments["file_path"], arguments.get("edits", ()))
+            result = analyzer.analyze_file(
+                arguments["file_path"], arguments.get("scope", "all")
+            )
+            return [TextContent(
+                type="text",
+                text=to_text(result)
+            )]
+
+        elif name == "analyze_c_files":
+            # O lote roda numa thread: o event loop segue atendendo pings e
+            # outras requisições enquanto os arquivos são analisados
+            results = await anyio.to_thread.run_sync(
+                analyze_batch, analyzer, arguments["paths"]
+            )
             return [TextContent(
                 type="text",
-                text=json.dumps(result, default=lambda o: o.__dict__, indent=2)
+                text=to_text(results)
             )]
 
         elif name == "list_functions":
             functions = analyzer.list_functions(arguments["file_path"])
             return [TextContent(
                 type="text",
-                text=json.dumps([f.__dict__ for f in functions], indent=2)
+                text=to_text(functions)
             )]
 
         elif name == "get_function_body":
@@ -183,87 +346,86 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             directives = analyzer.get_preprocessor_directives(arguments["file_path"])
             return [TextContent(
                 type="text",
-                text=json.dumps(directives, default=lambda o: o.__dict__, indent=2)
+                text=to_text(directives)
             )]
 
         elif name == "get_call_graph":
             return [TextContent(
                 type="text",
-                text=json.dumps(
-                    analyzer.get_call_graph(arguments["file_path"]),
-                    indent=2
+                text=to_text(
+                    analyzer.get_call_graph(arguments["file_path"])
                 )
             )]
 
         elif name == "get_function_dependencies":
             return [TextContent(
                 type="text",
-                text=json.dumps(
+                text=to_text(
                     analyzer.get_function_dependencies(
                         arguments["file_path"],
                         arguments["function_name"]
-                    ),
-                    indent=2
+                    )
                 )
             )]
 
         elif name == "summarize_function":
             return [TextContent(
                 type="text",
-                text=json.dumps(
+                text=to_text(
                     analyzer.summarize_function(
                         arguments["file_path"],
                         arguments["function_name"]
-                    ),
-                    indent=2
+                    )
                 )
             )]
 
         elif name == "list_globals":
             return [TextContent(
                 type="text",
-                text=json.dumps(
-                    analyzer.list_globals(arguments["file_path"]),
-                    indent=2
+                text=to_text(
+                    analyzer.list_globals(arguments["file_path"])
                 )
             )]
 
         elif name == "find_symbol":
             return [TextContent(
                 type="text",
-                text=json.dumps(
+                text=to_text(
                     analyzer.find_symbol(
                         arguments["file_path"],
                         arguments["symbol"]
-                    ),
-                    indent=2
+                    )
                 )
             )]
 
         elif name == "get_error_handling_paths":
             return [TextContent(
                 type="text",
-                text=json.dumps(
+                text=to_text(
                     analyzer.get_error_handling_paths(
                         arguments["file_path"],
                         arguments["function_name"]
-                    ),
-                    indent=2
+                    )
                 )
             )]
 
         elif name == "list_side_effects":
             return [TextContent(
                 type="text",
-                text=json.dumps(
+                text=to_text(
                     analyzer.list_side_effects(
                         arguments["file_path"],
                         arguments["function_name"]
-                    ),
-                    indent=2
+                    )
                 )
             )]
 
+        elif name == "notify_c_file_edit":
+            # Os outros analyzers detectam a mudança do arquivo sozinhos
+            edit = dict(arguments)
+            apply_edits(analyzer, edit.pop("file_path"), [edit])
+            return [TextContent(type="text", text="ok")]
+
         else:
             raise ValueError(f"Tool desconhecida: {name}")
 
@@ -274,8 +436,21 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         )]
 
 
+# Uma resposta grande (analyze de vários arquivos) sai em poucos write()
+# em vez de pedaços de 8 KiB; o stdio_server já faz flush por mensagem
+_STDOUT_BUFFER_SIZE = 64 * 1024
+
+
+def buffered_stdout() -> anyio.AsyncFile[str]:
+    """stdout em texto UTF-8 sobre um buffer de 64 KiB (não fecha o fd 1)"""
+    raw = open(sys.stdout.fileno(), "wb", buffering=_STDOUT_BUFFER_SIZE, closefd=False)
+    return anyio.wrap_file(TextIOWrapper(raw, encoding="utf-8"))
+
+
 async def main():
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+    async with mcp.server.stdio.stdio_server(stdout=buffered_stdout()) as (
+        read_stream, write_stream
+    ):
         await app.run(
             read_stream,
             write_stream,
@@ -0,0 +1,195 @@
+"""Unit tests for CachedAnalyzer."""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.ccodetools.factory import make_analyzer
+from src.ccodetools.impl.base import WorkerFactory
+from src.ccodetools.impl.cached_analyzer import CachedAnalyzer
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+SAMPLE_C = os.path.join(FIXTURES_DIR, 'sample.c')
+BITVEC_C = os.path.join(FIXTURES_DIR, 'bitvec.c')
+
+
+class TestCachedAnalyzer(unittest.TestCase):
+    """Test CachedAnalyzer on top of TreeSitterAnalyzer"""
+
+    @classmethod
+    def setUpClass(cls):
+        """One backend for the class; each test wraps it in a fresh cache"""
+        cls.backend = make_analyzer('tree-sitter')
+
+    def setUp(self):
+        """Copy sample.c to a temp dir so tests can modify it"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.tmp_dir, 'sample.c')
+        shutil.copy(SAMPLE_C, self.test_file)
+        self.analyzer = CachedAnalyzer(self.backend)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_results_are_cached(self):
+        """Test repeated calls reuse the cached result"""
+        first = self.analyzer.list_functions(self.test_file)
+        second = self.analyzer.list_functions(self.test_file)
+        self.assertIs(first, second)
+
+    def test_per_function_results_are_cached(self):
+        """Test function-level queries are cached per function name"""
+        add = self.analyzer.summarize_function(self.test_file, 'add')
+        main = self.analyzer.summarize_function(self.test_file, 'main')
+        self.assertEqual(add['function'], 'add')
+        self.assertEqual(main['function'], 'main')
+        self.assertIs(self.analyzer.summarize_function(self.test_file, 'add'), add)
+
+    def test_parts_of_cached_analysis_are_reused(self):
+        """Test functions and directives come from a cached analyze_file result"""
+        result = self.analyzer.analyze_file(self.test_file)
+        backend = self.analyzer._analyzer
+        with mock.patch.object(backend, 'list_functions') as list_functions, \
+                mock.patch.object(backend, 'get_preprocessor_directives') as directives, \
+                mock.patch.object(backend, 'analyze_file') as analyze_file:
+            self.assertIs(self.analyzer.list_functions(self.test_file), result.functions)
+            self.assertIs(
+                self.analyzer.get_preprocessor_directives(self.test_file)['defines'],
+                result.defines,
+            )
+            preproc = self.analyzer.analyze_file(self.test_file, 'preproc')
+            list_functions.assert_not_called()
+            directives.assert_not_called()
+            analyze_file.assert_not_called()
+        self.assertEqual(preproc.includes, result.includes)
+        self.assertEqual(preproc.functions, [])
+
+    def test_unchanged_file_is_not_rehashed(self):
+        """Test the stat fast path skips reading unchanged files"""
+        self.analyzer.list_functions(self.test_file)
+        with mock.patch.object(self.analyzer, '_read_and_hash') as read_and_hash:
+            self.analyzer.list_functions(self.test_file)
+            read_and_hash.assert_not_called()
+
+    def test_file_hash_shared_across_instances(self):
+        """Test another cached backend reuses the already computed hash"""
+        self.analyzer.list_functions(self.test_file)
+        other = CachedAnalyzer(self.backend)
+        with mock.patch.object(other, '_read_and_hash') as read_and_hash:
+            other.list_functions(self.test_file)
+            read_and_hash.assert_not_called()
+
+    def test_modified_file_invalidates_cache(self):
+        """Test editing the file produces fresh results"""
+        functions = self.analyzer.list_functions(self.test_file)
+        with open(self.test_file, 'a') as f:
+            f.write('\nint extra(void) { return 0; }\n')
+
+        updated = self.analyzer.list_functions(self.test_file)
+        self.assertEqual(len(updated), len(functions) + 1)
+        self.assertIn('extra', [f.name for f in updated])
+
+    def test_analyze_paths(self):
+        """Test batch analysis matches per-file analysis"""
+        bitvec_file = BITVEC_C
+        results = self.analyzer.analyze_paths(
+            [self.test_file, bitvec_file], max_workers=2
+        )
+
+        self.assertEqual(set(results), {self.test_file, bitvec_file})
+        self.assertEqual(results[bitvec_file], self.backend.analyze_file(bitvec_file))
+        # Results are now served from the in-memory cache
+        self.assertIs(self.analyzer.analyze_file(self.test_file), results[self.test_file])
+
+    def test_analyze_paths_counts_distinct_misses(self):
+        """Test duplicate or cached paths below min_misses never start a process pool"""
+        cached = self.analyzer.analyze_file(self.test_file)
+        with mock.patch('src.ccodetools.impl.cached_analyzer.ProcessPoolExecutor') as pool:
+            results = self.analyzer.analyze_paths(
+                [self.test_file] * 4 + [BITVEC_C] * 4, min_misses=2
+            )
+            pool.assert_not_called()
+
+        self.assertIs(results[self.test_file], cached)
+        self.assertIs(self.analyzer.analyze_file(BITVEC_C), results[BITVEC_C])
+
+    def test_analyze_paths_workers_match_backend(self):
+        """Test workers are built like the wrapped backend, mismatched factories are refused"""
+        try:
+            from src.ccodetools.impl.clang_analyzer import ClangAnalyzer
+            clang = ClangAnalyzer(compile_args=['-std=c99', '-DEXTRA=1'])
+        except Exception as e:
+            self.skipTest(f"clang analyzer not available: {e}")
+        factory = clang.worker_factory()
+        self.assertEqual(factory.cache_id, clang.cache_id)
+        self.assertEqual(factory().cache_id, clang.cache_id)
+
+        analyzer = CachedAnalyzer(clang)
+        # A factory carrying its cache_id is checked without building a backend
+        build = mock.Mock(side_effect=AssertionError)
+        with self.assertRaises(ValueError):
+            analyzer.analyze_paths([self.test_file], analyzer_factory=WorkerFactory(build, 'other'))
+        build.assert_not_called()
+        # Any other factory is checked in the worker, which fails the pool
+        with self.assertRaises(RuntimeError):
+            analyzer.analyze_paths([self.test_file], analyzer_factory=ClangAnalyzer)
+        with self.assertRaises(TypeError):
+            CachedAnalyzer(mock.Mock(spec=['analyze_file', 'cache_id'])).analyze_paths([self.test_file])
+
+    def test_analyze_files(self):
+        """Test thread batch analysis caches results and skips cached files"""
+        bitvec_file = BITVEC_C
+        cached = self.analyzer.analyze_file(self.test_file)
+        backend = self.analyzer._analyzer
+        with mock.patch.object(backend, 'analyze_files', wraps=backend.analyze_files) as batch:
+            results = self.analyzer.analyze_files([self.test_file, bitvec_file, bitvec_file])
+            batch.assert_called_once_with([bitvec_file], None)
+
+        self.assertIs(results[self.test_file], cached)
+        self.assertEqual(results[bitvec_file], self.backend.analyze_file(bitvec_file))
+        self.assertIs(self.analyzer.analyze_file(bitvec_file), results[bitvec_file])
+
+    def test_edit_is_forwarded(self):
+        """Test edit reports reach the wrapped analyzer"""
+        backend = self.analyzer._analyzer
+        with mock.patch.object(backend, 'edit') as edit:
+            self.analyzer.edit(self.test_file, 0, 0, 1, (0, 0), (0, 0), (0, 1))
+            edit.assert_called_once_with(self.test_file, 0, 0, 1, (0, 0), (0, 0), (0, 1))
+
+    def test_persistent_cache_across_instances(self):
+        """Test a new instance with the same cache_dir reuses stored results"""
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        functions = CachedAnalyzer(
+            self.backend, cache_dir=cache_dir
+        ).list_functions(self.test_file)
+
+        analyzer = CachedAnalyzer(self.backend, cache_dir=cache_dir)
+        with mock.patch.object(self.backend, 'list_functions') as list_functions:
+            cached = analyzer.list_functions(self.test_file)
+            list_functions.assert_not_called()
+        self.assertEqual(cached, functions)
+
+
+    def test_persistent_cache_prunes_older_versions(self):
+        """Test storing results for edited content deletes the old content's rows"""
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        analyzer = CachedAnalyzer(self.backend, cache_dir=cache_dir)
+        analyzer.analyze_file(self.test_file)
+        analyzer.get_function_body(self.test_file, 'add')
+        old_hash = analyzer._get_file_entry(self.test_file).hash
+
+        with open(self.test_file, 'a') as f:
+            f.write('\nint extra(void) { return 0; }\n')
+        analyzer.list_functions(self.test_file)
+
+        hashes = {h for (h,) in analyzer._db.execute(
+            "SELECT DISTINCT content_hash FROM artifacts WHERE file_path = ?", (self.test_file,)
+        )}
+        self.assertEqual(len(hashes), 1)
+        self.assertNotIn(old_hash, hashes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""Unit tests for the click CLI."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from src.ccodetools.cli import cli
+from src.ccodetools.impl.tree_sitter import TreeSitterAnalyzer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+SAMPLE_C = os.path.join(FIXTURES_DIR, 'sample.c')
+
+
+class TestCliCache(unittest.TestCase):
+    """Test --cache-dir persists results across CLI invocations"""
+
+    def test_cache_dir_serves_later_runs(self):
+        """Test a second run with the same cache dir does not analyze again"""
+        runner = CliRunner()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            args = ['--cache-dir', cache_dir, 'list-functions', SAMPLE_C, '--json']
+            first = runner.invoke(cli, args)
+            self.assertEqual(first.exit_code, 0, first.output)
+            self.assertTrue(os.path.exists(os.path.join(cache_dir, 'cache.sqlite3')))
+
+            with mock.patch.object(TreeSitterAnalyzer, 'list_functions', side_effect=AssertionError):
+                second = runner.invoke(cli, args)
+                env = runner.invoke(cli, args[2:], env={'CCODETOOLS_CACHE_DIR': cache_dir})
+            self.assertEqual(second.exit_code, 0, second.output)
+            self.assertEqual(second.output, first.output)
+            self.assertEqual(env.output, first.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Unit tests for the result dataclasses in interface.py."""
+import unittest
+from collections.abc import Mapping
+from dataclasses import asdict
+
+import orjson
+
+from src.ccodetools.cli import to_json
+from src.ccodetools.interface import (
+    AnalysisResult, EnumInfo, FunctionInfo, Parameter, PreprocessorDirective, StructInfo,
+)
+
+
+class TestToDict(unittest.TestCase):
+    """Test the generated to_dict matches dataclasses.asdict"""
+
+    def setUp(self):
+        self.function = FunctionInfo(
+            name='add',
+            signature='int add(int a, int b)',
+            start_line=1,
+            end_line=3,
+            return_type='int',
+            parameters=[{'type': 'int', 'name': 'a'}, {'type': 'int', 'name': 'b'}],
+        )
+        self.define = PreprocessorDirective(type='define', content='MAX', line=5, value='100')
+
+    def test_function_info_to_dict(self):
+        """Test FunctionInfo.to_dict"""
+        self.assertEqual(self.function.to_dict(), asdict(self.function))
+
+    def test_analysis_result_to_dict_nested(self):
+        """Test AnalysisResult.to_dict converts nested dataclasses"""
+        result = AnalysisResult(
+            file_path='sample.c',
+            functions=[self.function],
+            includes=[],
+            defines=[self.define],
+            conditionals=[],
+            structs=[{'name': 'Point', 'line': 10}],
+            enums=[],
+            typedefs=[],
+        )
+        self.assertEqual(result.to_dict(), asdict(result))
+
+    def test_to_dict_does_not_share_containers(self):
+        """Test mutating the dict does not affect the dataclass"""
+        data = self.function.to_dict()
+        data['parameters'][0]['name'] = 'x'
+        self.assertEqual(self.function.parameters[0]['name'], 'a')
+
+    def test_parameter_objects(self):
+        """Test Parameter serializes like the dicts it replaces and keeps key access"""
+        function = FunctionInfo(
+            name='add',
+            signature='int add(int a, int b)',
+            start_line=1,
+            end_line=3,
+            return_type='int',
+            parameters=[Parameter('int', 'a'), Parameter('int', 'b')],
+        )
+        self.assertEqual(function.to_dict(), self.function.to_dict())
+        self.assertEqual(function.to_dict(), asdict(function))
+        self.assertEqual(function.parameters[1]['name'], 'b')
+        with self.assertRaises(KeyError):
+            function.parameters[0]['default']
+
+    def test_struct_and_enum_objects(self):
+        """Test StructInfo/EnumInfo serialize like the dicts they replace and keep key access"""
+        struct = StructInfo('Point', 8, 11)
+        enum = EnumInfo('Status', 14)
+        self.assertEqual(struct.to_dict(), {'name': 'Point', 'line': 8, 'end_line': 11})
+        self.assertEqual(enum.to_dict(), {'name': 'Status', 'line': 14})
+        self.assertEqual(struct['name'], 'Point')
+        with self.assertRaises(KeyError):
+            enum['values']
+        result = AnalysisResult(
+            file_path='sample.c', functions=[], includes=[], defines=[], conditionals=[],
+            structs=[struct], enums=[enum], typedefs=[],
+        )
+        self.assertEqual(result.to_dict(), asdict(result))
+
+    def test_records_behave_like_the_dicts_they_replace(self):
+        """Test Parameter/StructInfo/EnumInfo compare, get and iterate like the old dicts"""
+        param = Parameter('int', 'a')
+        self.assertEqual(param, {'type': 'int', 'name': 'a'})
+        self.assertEqual({'type': 'int', 'name': 'a'}, param)
+        self.assertNotEqual(param, {'type': 'int', 'name': 'b'})
+        self.assertEqual(param.get('name'), 'a')
+        self.assertIsNone(param.get('default'))
+        self.assertNotIn('default', param)
+        self.assertEqual(list(param.keys()), ['type', 'name'])
+        self.assertEqual(dict(StructInfo('Point', 8, 11)), {'name': 'Point', 'line': 8, 'end_line': 11})
+        self.assertEqual(EnumInfo('Status', 14), {'name': 'Status', 'line': 14})
+        self.assertEqual(self.function.parameters, [Parameter('int', 'a'), Parameter('int', 'b')])
+        self.assertIsInstance(param, Mapping)
+
+    def test_result_types_have_slots(self):
+        """Test every result object is slots-only (no per-instance dict)"""
+        for obj in (self.function, self.define, Parameter('int', 'a'),
+                    StructInfo('Point', 8, 11), EnumInfo('Status', 14)):
+            self.assertFalse(hasattr(obj, '__dict__'))
+            with self.assertRaises(AttributeError):
+                obj.unknown_field = 1
+
+    def test_slots_results_serialize_to_json(self):
+        """Test slots dataclasses (no __dict__) serialize like their to_dict"""
+        result = AnalysisResult(
+            file_path='sample.c',
+            functions=[self.function],
+            includes=[],
+            defines=[self.define],
+            conditionals=[],
+            structs=[],
+            enums=[],
+            typedefs=[],
+        )
+        self.assertFalse(hasattr(result, '__dict__'))
+        self.assertFalse(hasattr(Parameter('int', 'a'), '__dict__'))
+        self.assertEqual(orjson.loads(to_json(result)), result.to_dict())
+        self.assertEqual(orjson.loads(to_json({'sample.c': [self.define]})),
+                         {'sample.c': [self.define.to_dict()]})
+
+
+if __name__ == '__main__':
+    unittest.main()
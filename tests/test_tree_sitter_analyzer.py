@@ -1,18 +1,49 @@
 """Unit tests for C code analyzers - testing the CCodeAnalyzer interface."""
 import unittest
 import os
+import shutil
+import tempfile
+from unittest import mock
 from typing import Literal
 from src.ccodetools.factory import make_analyzer
-from src.ccodetools.interface import CCodeAnalyzer
+from src.ccodetools.interface import AnalysisResult, CCodeAnalyzer, FunctionInfo
+from src.ccodetools.impl import base as base_impl
+from src.ccodetools.impl import tree_sitter as tree_sitter_impl
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+SAMPLE_C = os.path.join(FIXTURES_DIR, 'sample.c')
+BITVEC_C = os.path.join(FIXTURES_DIR, 'bitvec.c')
+PCACHE_C = os.path.join(FIXTURES_DIR, 'pcache.c')
+
+# One analyzer per backend for the whole module; tests that need a fresh
+# cache call make_analyzer themselves
+_analyzers: dict[str, CCodeAnalyzer] = {}
 
 
 def get_analyzer(name: Literal['tree-sitter', 'clang']) -> CCodeAnalyzer:
-    """Get analyzer by name, skip test if unavailable."""
-    try:
-        return make_analyzer(name)
-    except (ImportError, RuntimeError, Exception) as e:
-        # Catch all exceptions to handle library version mismatches
-        raise unittest.SkipTest(f"{name} analyzer not available: {e}")
+    """Get the shared analyzer by name, skip test if unavailable."""
+    if name not in _analyzers:
+        try:
+            _analyzers[name] = make_analyzer(name)
+        except (ImportError, RuntimeError, Exception) as e:
+            # Catch all exceptions to handle library version mismatches
+            raise unittest.SkipTest(f"{name} analyzer not available: {e}")
+    return _analyzers[name]
+
+
+def setUpModule():
+    """Parse the fixtures shared by the test classes once, in parallel
+
+    Both backends release the GIL while parsing, so each backend's
+    analyze_files thread pool overlaps the parses of the large fixtures.
+    """
+    fixtures = [SAMPLE_C, BITVEC_C, PCACHE_C]
+    for name in ('tree-sitter', 'clang'):
+        try:
+            analyzer = get_analyzer(name)
+        except unittest.SkipTest:
+            continue
+        analyzer.analyze_files(fixtures)
 
 
 class AnalyzerTestMixin:
@@ -21,16 +52,15 @@ class AnalyzerTestMixin:
     analyzer_name: Literal['tree-sitter', 'clang']
     analyzer: CCodeAnalyzer
     test_file: str
+    result: AnalysisResult
 
     @classmethod
     def setUpClass(cls):
         """Set up test fixtures"""
         cls.analyzer = get_analyzer(cls.analyzer_name)
-        cls.test_file = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'sample.c'
-        )
+        cls.test_file = SAMPLE_C
+        # One full analysis serves every test that only reads its parts
+        cls.result = cls.analyzer.analyze_file(cls.test_file)
 
     def test_list_functions(self):
         """Test listing functions from C file"""
@@ -51,7 +81,7 @@ class AnalyzerTestMixin:
         functions = self.analyzer.list_functions(self.test_file)
 
         # Find the 'add' function
-        add_func = next(f for f in functions if f.name == 'add')
+        add_func = {f.name: f for f in functions}['add']
 
         self.assertEqual(add_func.return_type, 'int')
         self.assertEqual(len(add_func.parameters), 2)
@@ -59,6 +89,14 @@ class AnalyzerTestMixin:
         self.assertEqual(add_func.parameters[0]['name'], 'a')
         self.assertGreater(add_func.end_line, add_func.start_line)
 
+    def test_get_functions_by_names(self):
+        """Test batch lookup returns the requested functions and skips unknown names"""
+        found = self.analyzer.get_functions_by_names(self.test_file, frozenset({'add', 'main', 'nonexistent'}))
+
+        self.assertEqual(sorted(found), ['add', 'main'])
+        by_name = {f.name: f for f in self.analyzer.list_functions(self.test_file)}
+        self.assertEqual(found['add'], by_name['add'])
+
     def test_get_function_body(self):
         """Test retrieving specific function body"""
         body = self.analyzer.get_function_body(self.test_file, 'add')
@@ -73,8 +111,7 @@ class AnalyzerTestMixin:
 
     def test_extract_includes(self):
         """Test extracting include directives"""
-        directives = self.analyzer.get_preprocessor_directives(self.test_file)
-        includes = directives['includes']
+        includes = self.result.includes
 
         self.assertGreaterEqual(len(includes), 2)
         include_contents = [inc.content for inc in includes]
@@ -83,8 +120,7 @@ class AnalyzerTestMixin:
 
     def test_extract_defines(self):
         """Test extracting define directives"""
-        directives = self.analyzer.get_preprocessor_directives(self.test_file)
-        defines = directives['defines']
+        defines = self.result.defines
 
         self.assertGreaterEqual(len(defines), 2)
         define_names = [d.content for d in defines]
@@ -95,9 +131,135 @@ class AnalyzerTestMixin:
         max_size = next(d for d in defines if d.content == 'MAX_SIZE')
         self.assertEqual(max_size.value, '100')
 
+    def test_directive_lines_skip_mid_line_hash(self):
+        """Test directive line numbers and that '#' inside a line is ignored"""
+        source = (
+            '#include <stdio.h>\n'
+            '  #define LIMIT 10\n'
+            'const char *s = "#define NOT_A_MACRO 1";\n'
+            '/* #include "nope.h" */\n'
+            '#ifdef LIMIT\n'
+            '#endif\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'directives.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            directives = self.analyzer.get_preprocessor_directives(path)
+
+        self.assertEqual([(d.content, d.line) for d in directives['includes']],
+                         [('#include <stdio.h>', 1)])
+        self.assertEqual([(d.content, d.value, d.line) for d in directives['defines']],
+                         [('LIMIT', '10', 2)])
+        self.assertEqual([(d.type, d.line) for d in directives['conditionals']],
+                         [('ifdef', 5), ('endif', 6)])
+
+    def test_directives_with_blanks_after_hash(self):
+        """Test '#  define' style directives are recognized"""
+        source = (
+            '#ifndef NDEBUG\n'
+            '# include <assert.h>\n'
+            '#  define CHECK(x) assert(x)\n'
+            '#\telse\n'
+            '#endif\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'indented.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            directives = self.analyzer.get_preprocessor_directives(path)
+
+        self.assertEqual([(d.content, d.line) for d in directives['includes']],
+                         [('# include <assert.h>', 2)])
+        self.assertEqual([(d.content, d.value, d.line) for d in directives['defines']],
+                         [('CHECK', '(x) assert(x)', 3)])
+        self.assertEqual([(d.type, d.line) for d in directives['conditionals']],
+                         [('ifndef', 1), ('else', 4), ('endif', 5)])
+
+    def test_conditional_keywords_are_prefix_matched(self):
+        """Test directive keywords match as prefixes, longest alternative first"""
+        source = (
+            '#ifdef A\n'
+            '#elifdef B\n'
+            '#elif C\n'
+            '#else\n'
+            '#endif\n'
+            '#if D\n'
+            '#endif\n'
+            '#include_next <limits.h>\n'
+            '#pragma once\n'
+            '#undef A\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'conditionals.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            directives = self.analyzer.get_preprocessor_directives(path)
+
+        self.assertEqual([(d.type, d.line) for d in directives['conditionals']], [
+            ('ifdef', 1), ('elif', 2), ('elif', 3), ('else', 4),
+            ('endif', 5), ('if', 6), ('endif', 7),
+        ])
+        self.assertEqual([d.content for d in directives['includes']], ['#include_next <limits.h>'])
+        self.assertEqual(directives['defines'], [])
+
+    def test_define_name_and_value_split(self):
+        """Test #define names end at space, tab or '(' and empty values are None"""
+        source = (
+            '#define MIN(a, b) ((a) < (b) ? (a) : (b))\n'
+            '#define\tTABBED\t1\n'
+            '#define EMPTY\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'defines.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            defines = self.analyzer.get_preprocessor_directives(path)['defines']
+
+        self.assertEqual([(d.content, d.value) for d in defines], [
+            ('MIN', '(a, b) ((a) < (b) ? (a) : (b))'),
+            ('TABBED', '1'),
+            ('EMPTY', None),
+        ])
+
+    def test_define_split_with_crlf_line_endings(self):
+        """Test CRLF line endings do not leak into define names or values"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'crlf.c')
+            with open(path, 'wb') as f:
+                f.write(b'#define LIMIT 10\r\n#define FLAG\r\n#define SQ(x) ((x)*(x))\r\n')
+            defines = self.analyzer.get_preprocessor_directives(path)['defines']
+
+        self.assertEqual([(d.content, d.value, d.line) for d in defines], [
+            ('LIMIT', '10', 1),
+            ('FLAG', None, 2),
+            ('SQ', '(x) ((x)*(x))', 3),
+        ])
+
+    def test_type_strings_are_shared(self):
+        """Test repeated return/parameter type spellings share one str object"""
+        functions = self.analyzer.list_functions(self.test_file)
+        ints = [f.return_type for f in functions if f.return_type == 'int']
+        ints += [p.type for f in functions for p in f.parameters if p.type == 'int']
+        self.assertGreater(len(ints), 1)
+        self.assertTrue(all(t is ints[0] for t in ints))
+
+    def test_analyze_files(self):
+        """Test threaded batch analysis matches per-file analysis"""
+        paths = [
+            self.test_file,
+            BITVEC_C,
+            self.test_file,
+        ]
+        results = self.analyzer.analyze_files(paths, max_workers=2)
+
+        self.assertEqual(list(results), paths[:2])
+        for path, result in results.items():
+            self.assertEqual(result, self.analyzer.analyze_file(path))
+
     def test_analyze_file_complete(self):
         """Test complete file analysis"""
-        result = self.analyzer.analyze_file(self.test_file)
+        result = self.result
 
         self.assertEqual(result.file_path, self.test_file)
         self.assertEqual(len(result.functions), 4)
@@ -106,25 +268,42 @@ class AnalyzerTestMixin:
         self.assertGreaterEqual(len(result.structs), 1)
         self.assertGreaterEqual(len(result.enums), 1)
 
+    def test_analyze_file_scope(self):
+        """Test partial analysis scopes return the matching parts of the full result"""
+        full = self.result
+
+        preproc = self.analyzer.analyze_file(self.test_file, 'preproc')
+        self.assertEqual(preproc.includes, full.includes)
+        self.assertEqual(preproc.conditionals, full.conditionals)
+        self.assertEqual(preproc.functions, [])
+        self.assertEqual(preproc.structs, [])
+
+        functions = self.analyzer.analyze_file(self.test_file, 'functions')
+        self.assertEqual(functions.functions, full.functions)
+        self.assertEqual(functions.defines, [])
+
+        with self.assertRaises(ValueError):
+            self.analyzer.analyze_file(self.test_file, 'bogus')
+
     def test_extract_structs(self):
         """Test extracting struct definitions"""
-        result = self.analyzer.analyze_file(self.test_file)
+        result = self.result
 
         self.assertGreaterEqual(len(result.structs), 1)
-        struct_names = [s['name'] for s in result.structs]
+        struct_names = [s.name for s in result.structs]
         self.assertIn('Point', struct_names)
 
     def test_extract_enums(self):
         """Test extracting enum definitions"""
-        result = self.analyzer.analyze_file(self.test_file)
+        result = self.result
 
         self.assertGreaterEqual(len(result.enums), 1)
-        enum_names = [e['name'] for e in result.enums]
+        enum_names = [e.name for e in result.enums]
         self.assertIn('Status', enum_names)
 
     def test_extract_typedefs(self):
         """Test extracting typedef definitions"""
-        result = self.analyzer.analyze_file(self.test_file)
+        result = self.result
 
         # At least one typedef (Point_t)
         self.assertGreaterEqual(len(result.typedefs), 0)
@@ -134,11 +313,402 @@ class TestTreeSitterAnalyzer(AnalyzerTestMixin, unittest.TestCase):
     """Test TreeSitterAnalyzer implementation"""
     analyzer_name: Literal['tree-sitter'] = 'tree-sitter'
 
+    def test_queries_are_compiled_once(self):
+        """Test analyzers share the language and compiled queries"""
+        first = make_analyzer('tree-sitter')
+        second = make_analyzer('tree-sitter')
+        first._ensure_parser()
+        second._ensure_parser()
+        self.assertIs(first.c_language, second.c_language)
+        for attr in ('_id_query', '_fn_query', '_defs_query', '_call_query'):
+            self.assertIs(getattr(first, attr), getattr(second, attr))
+
+    def test_parser_is_shared_across_calls(self):
+        """Test one Parser serves every file; batch workers get their own"""
+        analyzer = make_analyzer('tree-sitter')
+        analyzer.list_functions(self.test_file)
+        parser = analyzer.parser
+        bitvec = BITVEC_C
+        analyzer.analyze_file(bitvec)
+        analyzer.analyze_files([self.test_file, bitvec], max_workers=2)
+        self.assertIs(analyzer.parser, parser)
+        self.assertIsNone(getattr(tree_sitter_impl._thread_state, 'parser', None))
+
+    def test_function_infos_are_built_once_per_tree(self):
+        """Test list_functions and analyze_file share one FunctionInfo list"""
+        analyzer = make_analyzer('tree-sitter')
+        functions = analyzer.list_functions(self.test_file)
+        result = analyzer.analyze_file(self.test_file)
+        self.assertEqual(result.functions, functions)
+        self.assertTrue(all(a is b for a, b in zip(result.functions, functions)))
+        # Each caller owns its list
+        functions.clear()
+        self.assertEqual(len(analyzer.list_functions(self.test_file)), 4)
+
+    def test_tree_cache_evicts_least_recently_used(self):
+        """Test the tree cache is bounded and keeps recently used files"""
+        bitvec = BITVEC_C
+        pcache = PCACHE_C
+        analyzer = tree_sitter_impl.TreeSitterAnalyzer(max_trees=2)
+        analyzer.list_functions(self.test_file)
+        analyzer.list_functions(bitvec)
+        tree = analyzer._parse(self.test_file)[1]
+        analyzer.list_functions(pcache)
+
+        self.assertEqual(list(analyzer._tree_cache), [self.test_file, pcache])
+        self.assertIs(analyzer._parse(self.test_file)[1], tree)
+
+    def test_body_of_evicted_tree_is_read_by_span(self):
+        """Test get_function_body reads an evicted file's body without reparsing"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            bitvec = BITVEC_C
+            analyzer = make_analyzer('tree-sitter')
+            analyzer._max_trees = 1
+            analyzer.list_functions(path)
+            analyzer.list_functions(bitvec)
+
+            expected = self.analyzer.get_function_body(path, 'add')
+            self.assertEqual(analyzer.get_function_body(path, 'add'), expected)
+            self.assertIsNone(analyzer.get_function_body(path, 'nonexistent'))
+            self.assertNotIn(path, analyzer._tree_cache)
+
+            # A changed file is parsed again
+            with open(path, 'a') as f:
+                f.write('\nint extra(void) { return 1; }\n')
+            self.assertIn('return 1', analyzer.get_function_body(path, 'extra'))
+            self.assertIn(path, analyzer._tree_cache)
+            self.assertNotIn(path, analyzer._body_spans)
+
+    def test_symbol_index_is_reused(self):
+        """Test find_symbol answers from one index per tree, with caller-owned lines"""
+        analyzer = make_analyzer('tree-sitter')
+        first = analyzer.find_symbol(self.test_file, 'add')
+        self.assertTrue(first['lines'])
+        first['lines'].clear()
+        self.assertEqual(analyzer.find_symbol(self.test_file, 'add'),
+                         self.analyzer.find_symbol(self.test_file, 'add'))
+        self.assertEqual(analyzer.find_symbol(self.test_file, 'nonexistent')['lines'], [])
+
+    def test_count_functions_builds_no_function_infos(self):
+        """Test count_functions matches list_functions without materializing it"""
+        analyzer = make_analyzer('tree-sitter')
+        for path in (self.test_file, BITVEC_C, PCACHE_C):
+            count = analyzer.count_functions(path)
+            content, tree = analyzer._parse(path)
+            self.assertNotIn('functions', analyzer._tree_memo(path, tree))
+            self.assertEqual(count, len(analyzer.list_functions(path)))
+            self.assertEqual(analyzer.count_functions(path), count)
+
+    def test_function_bodies_are_memoized_per_tree(self):
+        """Test repeated get_function_body calls, misses included, skip the lookup"""
+        analyzer = make_analyzer('tree-sitter')
+        first = analyzer.get_function_body(self.test_file, 'add')
+        self.assertIsNone(analyzer.get_function_body(self.test_file, 'nonexistent'))
+        with mock.patch.object(analyzer, '_find_body', side_effect=AssertionError):
+            self.assertIs(analyzer.get_function_body(self.test_file, 'add'), first)
+            self.assertIsNone(analyzer.get_function_body(self.test_file, 'nonexistent'))
+
+    def test_one_parse_serves_every_query(self):
+        """Test the path-based queries on one file share a single parse"""
+        analyzer = make_analyzer('tree-sitter')
+        analyzer._ensure_parser()
+        pcache = PCACHE_C
+        with mock.patch.object(analyzer, 'parser', wraps=analyzer.parser) as parser:
+            analyzer.list_functions(pcache)
+            analyzer.get_preprocessor_directives(pcache)
+            analyzer.analyze_file(pcache)
+            analyzer.get_function_body(pcache, 'sqlite3PcacheOpen')
+            analyzer.find_symbol(pcache, 'PCache')
+            analyzer.summarize_function(pcache, 'sqlite3PcacheFetch')
+            self.assertEqual(parser.parse.call_count, 1)
+
+    def test_grammar_loads_on_first_parse(self):
+        """Test directive-only calls do not load the grammar"""
+        analyzer = make_analyzer('tree-sitter')
+        analyzer.get_preprocessor_directives(self.test_file)
+        analyzer.analyze_file(self.test_file, 'preproc')
+        self.assertFalse(analyzer._parser_ready)
+        self.assertTrue(analyzer.list_functions(self.test_file))
+        self.assertTrue(analyzer._parser_ready)
+
+    def test_tree_is_reused_until_file_changes(self):
+        """Test the parsed tree is cached and refreshed after an edit"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            analyzer = make_analyzer('tree-sitter')
+            functions = analyzer.list_functions(path)
+            tree = analyzer._parse(path)[1]
+            self.assertIs(analyzer._parse(path)[1], tree)
+
+            with open(path, 'a') as f:
+                f.write('\nint extra(void) { return 0; }\n')
+
+            updated = analyzer.list_functions(path)
+            self.assertIsNot(analyzer._parse(path)[1], tree)
+            self.assertEqual(len(updated), len(functions) + 1)
+            # Incremental reparse must match a parse from scratch
+            self.assertEqual(updated, make_analyzer('tree-sitter').list_functions(path))
+
+    def test_function_scan_is_shared_until_file_changes(self):
+        """Test per-function queries share one scan, refreshed after an edit"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            analyzer = make_analyzer('tree-sitter')
+            scan = analyzer._scan_function(path, 'main')
+            analyzer.summarize_function(path, 'main')
+            self.assertIs(analyzer._scan_function(path, 'main'), scan)
+
+            with open(path, 'a') as f:
+                f.write('\nint extra(void) { return 0; }\n')
+
+            self.assertIsNot(analyzer._scan_function(path, 'main'), scan)
+            self.assertEqual(analyzer.get_error_handling_paths(path, 'extra'),
+                             [{'line': analyzer.list_functions(path)[-1].start_line, 'type': 'return'}])
+
+    def test_touched_file_keeps_its_tree(self):
+        """Test a stat change with the same content reuses tree and scans"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            analyzer = make_analyzer('tree-sitter')
+            tree = analyzer._parse(path)[1]
+            scan = analyzer._scan_function(path, 'main')
+
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+            self.assertIs(analyzer._parse(path)[1], tree)
+            self.assertIs(analyzer._scan_function(path, 'main'), scan)
+
+    def test_function_body_index_follows_edits(self):
+        """Test the first definition's body is returned and refreshed after an edit"""
+        source = (
+            '#ifdef FAST\n'
+            'static char *pick(void) { return "fast"; }\n'
+            '#else\n'
+            'static char *pick(void) { return "slow"; }\n'
+            '#endif\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'pick.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            analyzer = make_analyzer('tree-sitter')
+            self.assertEqual(analyzer.get_function_body(path, 'pick'), '{ return "fast"; }')
+
+            with open(path, 'w') as f:
+                f.write(source.replace('fast', 'quick'))
+            self.assertEqual(analyzer.get_function_body(path, 'pick'), '{ return "quick"; }')
+
+    def test_reported_edits_drive_reparse(self):
+        """Test edits reported through edit() are used for the reparse"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'edit.c')
+            with open(path, 'w') as f:
+                f.write('int a(void) { return 1; }\n')
+            analyzer = make_analyzer('tree-sitter')
+            analyzer.list_functions(path)
+
+            # 'a' -> 'alpha', then '1' -> '10' in the edited text
+            analyzer.edit(path, 4, 5, 9, (0, 4), (0, 5), (0, 9))
+            analyzer.edit(path, 25, 26, 27, (0, 25), (0, 26), (0, 27))
+            with open(path, 'w') as f:
+                f.write('int alpha(void) { return 10; }\n')
+
+            self.assertEqual(analyzer.get_function_body(path, 'alpha'), '{ return 10; }')
+            self.assertEqual(analyzer.list_functions(path),
+                             make_analyzer('tree-sitter').list_functions(path))
+            self.assertEqual(analyzer._pending_edits, {})
+
+            # Edits that do not add up to the new size are ignored
+            analyzer.edit(path, 0, 0, 100, (0, 0), (0, 0), (0, 100))
+            with open(path, 'w') as f:
+                f.write('int beta(void) { return 2; }\n')
+            self.assertEqual([f.name for f in analyzer.list_functions(path)], ['beta'])
+
+    def test_nested_function_scopes(self):
+        """Test a GNU nested function's calls are kept out of its parent's scan"""
+        source = (
+            'int outer(void) {\n'
+            '    int inner(void) { return b(); }\n'
+            '    return a() + inner();\n'
+            '}\n'
+            'int plain(void) { return c(); }\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'nested.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            analyzer = make_analyzer('tree-sitter')
+            calls = {
+                name: analyzer.get_function_dependencies(path, name)['calls']
+                for name in ('outer', 'inner', 'plain')
+            }
+            self.assertEqual(calls, {'outer': ['a', 'inner'], 'inner': ['b'], 'plain': ['c']})
+            # not top level, found through the definition index
+            self.assertEqual(analyzer.get_function_body(path, 'inner'), '{ return b(); }')
+
+    def test_parameter_types_come_from_type_field(self):
+        """Test parameter types are the 'type' field (like return_type) and non-ASCII text decodes"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'params.c')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('int größe(const char *näme, volatile unsigned int n, void *) { return n; }\n')
+            func = make_analyzer('tree-sitter').list_functions(path)[0]
+
+        self.assertEqual(func.name, 'größe')
+        self.assertEqual([(p.type, p.name) for p in func.parameters], [
+            ('char', '*näme'),
+            ('unsigned int', 'n'),
+            ('void', '*'),
+        ])
+        self.assertEqual(func.signature, 'int größe(char *näme, unsigned int n, void *)')
+
+    def test_list_globals_reports_identifiers(self):
+        """Test global names exclude initializers, pointers and array sizes"""
+        source = (
+            'int x = 5;\n'
+            'static const char *names[4] = {0};\n'
+            'int (*handler)(int, char **);\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'globals.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            globals_ = self.analyzer.list_globals(path)
+
+        self.assertEqual(globals_, [
+            {'name': 'x', 'line': 1},
+            {'name': 'names', 'line': 2},
+            {'name': 'handler', 'line': 3},
+        ])
+
+    def test_lines_are_split_on_first_access(self):
+        """Test _read_file defers splitting content into lines"""
+        content, lines = self.analyzer._read_file(self.test_file)
+        self.assertEqual(len(lines), content.count(b'\n') + 1)
+        self.assertEqual(lines[0], content.split(b'\n')[0])
+        self.assertEqual(list(lines), content.split(b'\n'))
+
+    def test_reads_are_cached_until_file_changes(self):
+        """Test repeated reads share one buffer and a changed file is read again"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            content, _ = self.analyzer._read_file(path)
+            self.assertIs(self.analyzer._read_file(path)[0], content)
+
+            with open(path, 'ab') as f:
+                f.write(b'\n/* appended */\n')
+            updated, lines = self.analyzer._read_file(path)
+            self.assertEqual(updated, content + b'\n/* appended */\n')
+            self.assertEqual(lines[-2], b'/* appended */')
+
+    def test_read_cache_keeps_one_version_per_path(self):
+        """Test rewriting a file replaces its cached content and the cache stays byte-bounded"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'edited.c')
+            for i in range(5):
+                with open(path, 'w') as f:
+                    f.write(f'int v{i} = {i};\n' * (i + 1))
+                self.analyzer._read_file(path)
+            self.assertEqual(base_impl._read_cache[path][1], b'int v4 = 4;\n' * 5)
+            self.assertEqual(list(base_impl._read_cache).count(path), 1)
+
+            with mock.patch.object(base_impl, '_READ_CACHE_BYTES', 64):
+                other = os.path.join(tmp_dir, 'other.c')
+                with open(other, 'wb') as f:
+                    f.write(b'x' * 60)
+                self.analyzer._read_file(other)
+                self.assertLessEqual(base_impl._read_cache_bytes, 64)
+                self.assertNotIn(path, base_impl._read_cache)
+            self.assertEqual(base_impl._read_cache_bytes,
+                             sum(len(entry[1]) for entry in base_impl._read_cache.values()))
+
+    def test_crlf_doc_comments_and_lines(self):
+        """Test CRLF files keep '\\r' out of doc comments and line numbers"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'crlf.c')
+            with open(path, 'wb') as f:
+                f.write(
+                    b'// Adds\r\n// two ints\r\nint add(int a, int b)\r\n{\r\n    return a + b;\r\n}\r\n'
+                    b'/* Block\r\n * comment */\r\nint one(void) { return 1; }\r\n'
+                )
+            functions = self.analyzer.list_functions(path)
+
+        self.assertEqual([(f.name, f.start_line, f.end_line, f.doc_comment) for f in functions], [
+            ('add', 3, 6, 'Adds\ntwo ints'),
+            ('one', 9, 9, 'Block  comment'),
+        ])
+
+    def test_directive_scan_never_splits_lines(self):
+        """Test analysis reads only bytes, lines stay unsplit"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            self.analyzer.analyze_file(path)
+            self.analyzer.get_preprocessor_directives(path)
+            content, lines = self.analyzer._read_file(path)
+            self.assertIs(self.analyzer._read_bytes(path), content)
+            self.assertIsNone(lines._lines)
+
 
 class TestClangAnalyzer(AnalyzerTestMixin, unittest.TestCase):
     """Test ClangAnalyzer implementation"""
     analyzer_name: Literal['clang'] = 'clang'
 
+    def test_full_tu_supersedes_declaration_only_tu(self):
+        """Test the full TU replaces the skip-bodies TU in the cache"""
+        analyzer = make_analyzer('clang')
+        globals_ = analyzer.list_globals(self.test_file)
+        self.assertEqual([k[3] for k in analyzer._tu_cache], [True])
+
+        analyzer.list_functions(self.test_file)
+        self.assertEqual([k[3] for k in analyzer._tu_cache], [False])
+        self.assertEqual(analyzer.list_globals(self.test_file), globals_)
+
+    def test_modified_file_reuses_reparsed_tu(self):
+        """Test an edited file is reparsed in place and results follow the edit"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            analyzer = make_analyzer('clang')
+            functions = analyzer.list_functions(path)
+            tu = analyzer._parse(path)
+
+            with open(path, 'a') as f:
+                f.write('\nint extra(void) { return 0; }\n')
+
+            updated = analyzer.list_functions(path)
+            self.assertIs(analyzer._parse(path), tu)
+            self.assertEqual(len(analyzer._tu_cache), 1)
+            self.assertEqual(len(updated), len(functions) + 1)
+            self.assertEqual(analyzer.get_function_body(path, 'extra'), 'int extra(void) { return 0; }\n')
+
+
+    def test_reparse_drops_tus_of_older_content(self):
+        """Test a declaration-only TU of old content is dropped when the file is reparsed"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.c')
+            shutil.copy(self.test_file, path)
+            analyzer = make_analyzer('clang')
+            analyzer.list_globals(path)    # declaration-only TU
+            analyzer.list_functions(path)  # full TU, supersedes it
+            analyzer.invalidate(path)
+            analyzer.list_globals(path)
+            old_hash = next(iter(analyzer._tu_cache))[1]
+
+            with open(path, 'a') as f:
+                f.write('\nint extra(void) { return 0; }\n')
+            analyzer.list_functions(path)
+
+            self.assertEqual([k[3] for k in analyzer._tu_cache], [False])
+            self.assertNotIn(old_hash, [k[1] for k in analyzer._tu_cache])
+
 
 class BitvecTestMixin:
     """Mixin for bitvec.c tests. Subclasses must set analyzer_name."""
@@ -146,55 +716,52 @@ class BitvecTestMixin:
     analyzer_name: Literal['tree-sitter', 'clang']
     analyzer: CCodeAnalyzer
     bitvec_file: str
+    fn_by_name: dict[str, FunctionInfo]
 
     @classmethod
     def setUpClass(cls):
         """Set up test fixtures"""
         cls.analyzer = get_analyzer(cls.analyzer_name)
-        cls.bitvec_file = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'bitvec.c'
-        )
+        cls.bitvec_file = BITVEC_C
+        cls.fn_by_name = cls.analyzer.get_functions_by_names(
+            cls.bitvec_file, frozenset({'sqlite3BitvecCreate', 'sqlite3BitvecTest'}))
 
     def test_bitvec_functions_count(self):
         """Test that all functions are detected in bitvec.c"""
-        functions = self.analyzer.list_functions(self.bitvec_file)
+        count = self.analyzer.count_functions(self.bitvec_file)
 
         # bitvec.c has 10 functions total, but some are inside #ifdef blocks
         # TreeSitter sees all (10), Clang only sees unconditional ones (8)
-        self.assertGreaterEqual(len(functions), 8)
+        self.assertGreaterEqual(count, 8)
 
     def test_bitvec_function_names(self):
         """Test that key SQLite Bitvec functions are found"""
         functions = self.analyzer.list_functions(self.bitvec_file)
-        function_names = [f.name for f in functions]
+        function_names = {f.name for f in functions}
 
         # Check for main public API functions
-        expected_functions = [
+        expected_functions = frozenset({
             'sqlite3BitvecCreate',
             'sqlite3BitvecTest',
             'sqlite3BitvecSet',
             'sqlite3BitvecClear',
             'sqlite3BitvecDestroy',
             'sqlite3BitvecSize'
-        ]
+        })
 
-        for func_name in expected_functions:
-            self.assertIn(func_name, function_names)
+        # One set difference; a failure lists every missing name at once
+        self.assertEqual(expected_functions - function_names, set())
 
     def test_bitvec_function_signatures(self):
         """Test function signature parsing for bitvec functions"""
-        functions = self.analyzer.list_functions(self.bitvec_file)
-
         # Find sqlite3BitvecCreate function
-        create_func = next((f for f in functions if f.name == 'sqlite3BitvecCreate'), None)
+        create_func = self.fn_by_name.get('sqlite3BitvecCreate')
         self.assertIsNotNone(create_func)
         self.assertIn('Bitvec', create_func.return_type)
         self.assertIsNotNone(create_func.signature)
 
         # Find sqlite3BitvecTest function
-        test_func = next((f for f in functions if f.name == 'sqlite3BitvecTest'), None)
+        test_func = self.fn_by_name.get('sqlite3BitvecTest')
         self.assertIsNotNone(test_func)
         self.assertEqual(test_func.return_type, 'int')
 
@@ -219,7 +786,7 @@ class BitvecTestMixin:
 
         # bitvec.c has the Bitvec struct
         self.assertGreaterEqual(len(result.structs), 1)
-        struct_names = [s['name'] for s in result.structs]
+        struct_names = [s.name for s in result.structs]
         self.assertIn('Bitvec', struct_names)
 
     def test_bitvec_function_body_retrieval(self):
@@ -257,32 +824,31 @@ class PcacheTestMixin:
     analyzer_name: Literal['tree-sitter', 'clang']
     analyzer: CCodeAnalyzer
     pcache_file: str
+    fn_by_name: dict[str, FunctionInfo]
 
     @classmethod
     def setUpClass(cls):
         """Set up test fixtures"""
         cls.analyzer = get_analyzer(cls.analyzer_name)
-        cls.pcache_file = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'pcache.c'
-        )
+        cls.pcache_file = PCACHE_C
+        cls.fn_by_name = cls.analyzer.get_functions_by_names(
+            cls.pcache_file, frozenset({'sqlite3PcacheInitialize', 'sqlite3PcacheOpen'}))
 
     def test_pcache_functions_count(self):
         """Test that all functions are detected in pcache.c"""
-        functions = self.analyzer.list_functions(self.pcache_file)
+        count = self.analyzer.count_functions(self.pcache_file)
 
         # pcache.c is a large file with many functions
         # TreeSitter sees all, Clang may see fewer due to #ifdef blocks
-        self.assertGreater(len(functions), 30)
+        self.assertGreater(count, 30)
 
     def test_pcache_function_names(self):
         """Test that key SQLite page cache functions are found"""
         functions = self.analyzer.list_functions(self.pcache_file)
-        function_names = [f.name for f in functions]
+        function_names = {f.name for f in functions}
 
         # Check for main public API functions
-        expected_functions = [
+        expected_functions = frozenset({
             'sqlite3PcacheInitialize',
             'sqlite3PcacheShutdown',
             'sqlite3PcacheOpen',
@@ -290,17 +856,16 @@ class PcacheTestMixin:
             'sqlite3PcacheFetch',
             'sqlite3PcacheDrop',
             'sqlite3PcacheRelease'
-        ]
+        })
 
-        for func_name in expected_functions:
-            self.assertIn(func_name, function_names, f"Function {func_name} not found")
+        self.assertEqual(expected_functions - function_names, set(), "Functions not found")
 
     def test_pcache_function_details(self):
         """Test detailed function information from pcache.c"""
         functions = self.analyzer.list_functions(self.pcache_file)
 
         # Find sqlite3PcacheInitialize function
-        init_func = next((f for f in functions if f.name == 'sqlite3PcacheInitialize'), None)
+        init_func = self.fn_by_name.get('sqlite3PcacheInitialize')
         self.assertIsNotNone(init_func)
         self.assertEqual(init_func.return_type, 'int')
 
@@ -335,10 +900,8 @@ class PcacheTestMixin:
 
     def test_pcache_function_parameters(self):
         """Test parameter extraction from pcache functions"""
-        functions = self.analyzer.list_functions(self.pcache_file)
-
         # Find sqlite3PcacheOpen which should have parameters
-        open_func = next((f for f in functions if f.name == 'sqlite3PcacheOpen'), None)
+        open_func = self.fn_by_name.get('sqlite3PcacheOpen')
         self.assertIsNotNone(open_func)
         self.assertIsNotNone(open_func.signature)
         self.assertGreater(open_func.start_line, 0)
@@ -375,11 +938,7 @@ class AdvancedFeaturesTestMixin:
     def setUpClass(cls):
         """Set up test fixtures"""
         cls.analyzer = get_analyzer(cls.analyzer_name)
-        cls.test_file = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'sample.c'
-        )
+        cls.test_file = SAMPLE_C
 
     def test_get_call_graph(self):
         """Test call graph extraction"""
@@ -537,6 +1096,10 @@ class TestAdvancedFeaturesClang(AdvancedFeaturesTestMixin, unittest.TestCase):
     """Test advanced features with ClangAnalyzer"""
     analyzer_name: Literal['clang'] = 'clang'
 
+    def test_find_symbol_skips_macro_cursors(self):
+        """Test macro definitions/expansions from the processing record are not symbol hits"""
+        self.assertEqual(self.analyzer.find_symbol(self.test_file, 'MAX_SIZE')['lines'], [])
+
 
 class AdvancedFeaturesBitvecTestMixin:
     """Mixin for testing advanced features on bitvec.c (real SQLite code)."""
@@ -549,11 +1112,7 @@ class AdvancedFeaturesBitvecTestMixin:
     def setUpClass(cls):
         """Set up test fixtures"""
         cls.analyzer = get_analyzer(cls.analyzer_name)
-        cls.bitvec_file = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'bitvec.c'
-        )
+        cls.bitvec_file = BITVEC_C
 
     def test_bitvec_call_graph(self):
         """Test call graph on real SQLite code"""